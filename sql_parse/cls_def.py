@@ -2,11 +2,44 @@
 # @author: Yang Liu
 # @email: v-yangliu4@microsoft.com
 
-from enum import Enum, unique
+from enum import Enum, IntEnum, unique
+from functools import lru_cache
+from contextlib import contextmanager
+import sys
 import utils
 
 TYPE2BASETYPE = {"Numeric": 1}
 
+# column labels of the LM csv rows, interned since one of them ends every row
+TOKEN_NOTNULL = sys.intern("[NOTNULL]")
+# Note: The `UNIQUE` constraint ensures that all values in a column are different,
+#       both the `UNIQUE` and `PRIMARY KEY` constraints provide a guarantee for uniqueness for a column or set of columns.
+#       A `PRIMARY KEY` constraint automatically has a `UNIQUE` constraint.
+#       However, you can have many `UNIQUE` constraints per table, but only one `PRIMARY KEY` constraint per table.
+TOKEN_UNIQUE = sys.intern("[UNIQUE]")
+TOKEN_EMPTY = sys.intern("")
+
+
+# quoting / prefix characters stripped from both ends of column and table names
+COL_NAME_STRIP_CHARS = '@\'`"[]'
+TAB_NAME_STRIP_CHARS = '#@\'`"[]'
+
+
+# the same table / column names show up again and again across the files of a repo,
+# so memoize the pure string transforms used when printing them
+@lru_cache(maxsize=200_000)
+def _cleansed_col_name(col_name):
+    # str.strip with a char set is a single C pass, ~10x faster than an anchored re.sub
+    return col_name.strip(COL_NAME_STRIP_CHARS)
+
+
+@lru_cache(maxsize=200_000)
+def _lm_token(s):
+    """Turn a cleansed table / column name into a single LM csv token:
+    camel case to underscore, then replace possible ' ' and ',' to '_' to avoid CSV parsing issue.
+    """
+    return utils.convert_camel_to_underscore(s).replace(' ', '_').replace(',', '_')
+
 
 @unique
 class ParseStage(Enum):
@@ -27,21 +60,15 @@ class ParseStage(Enum):
 
 
 class ColumnType:
+    __slots__ = ("col_type", "base_type")
+
     def __init__(self, col_type):
-        self.__col_type = col_type
-        self.__base_type = self.get_base_type(col_type)
+        self.col_type = col_type
+        self.base_type = self.get_base_type(col_type)
 
     def get_base_type(self, col_type):
         return 1
 
-    @property
-    def col_type(self):
-        return self.__col_type
-
-    @property
-    def base_type(self):
-        return self.__base_type
-
 
 @unique
 class BaseColumnType(Enum):
@@ -145,6 +172,31 @@ class Unknown(BaseColumnType):
     pass
 
 
+@unique
+class KeyKind(IntEnum):
+    """Enum class for the key types a Key object could hold."""
+    PrimaryKey = 0
+    CandidateKey = 1
+    UniqueKey = 2
+    UniqueIndex = 3
+    Index = 4
+    UniqueColumn = 5
+
+    def __str__(self):
+        return self.name
+
+    def __format__(self, format_spec):
+        return format(self.name, format_spec)
+
+
+_KEY_KIND_MAP = dict(KeyKind.__members__)
+
+# key types whose columns are not assumed to be unique on their own when labeling columns
+NON_UNIQUE_KEY_TYPES = frozenset((KeyKind.Index, KeyKind.CandidateKey, KeyKind.UniqueKey, KeyKind.UniqueIndex))
+# key types declared with the UNIQUE keyword
+UNIQUE_KEY_TYPES = frozenset((KeyKind.UniqueKey, KeyKind.UniqueIndex, KeyKind.UniqueColumn))
+
+
 class Key:
     """Key class for Primary Key, Candidate Key, Unique Index and Unique Column object construction.
     A table can have only one primary key, which may consist of single or multiple fields.
@@ -155,30 +207,26 @@ class Key:
 
     Params
     ------
-    - key_type: str
+    - key_type: Union[str, KeyKind]
     - key_col_list: list[Column]
 
     Attribs
     -------
-    - key_type: str
+    - key_type: KeyKind
     - key_col_list: list[Column]
+    - key_col_names: tuple[str], the names of the key's columns, taken once at construction
 
     Returns
     -------
     - a Key object
     """
 
-    def __init__(self, key_type, key_col_list):
-        self.__key_type = key_type
-        self.__key_col_list = key_col_list
-
-    @property
-    def key_type(self):
-        return self.__key_type
+    __slots__ = ("key_type", "key_col_list", "key_col_names")
 
-    @property
-    def key_col_list(self):
-        return self.__key_col_list
+    def __init__(self, key_type, key_col_list):
+        self.key_type = key_type if isinstance(key_type, KeyKind) else _KEY_KIND_MAP[key_type]
+        self.key_col_list = key_col_list
+        self.key_col_names = tuple(col.col_name for col in key_col_list)
 
 
 class ForeignKey:
@@ -204,29 +252,14 @@ class ForeignKey:
     - a ForeignKey object
     """
 
-    def __init__(self, fk_tab_obj, fk_col_list, ref_tab_obj, ref_col_list):
-        self.__fk_tab_obj = fk_tab_obj
-        self.__fk_col_list = fk_col_list
-        if not isinstance(ref_tab_obj, Table):
-            raise ValueError("param `ref_tab_obj` must be a Table object!")
-        self.__ref_tab_obj = ref_tab_obj
-        self.__ref_col_list = ref_col_list
+    __slots__ = ("fk_tab", "fk_cols", "ref_tab", "ref_cols")
 
-    @property
-    def fk_tab(self):
-        return self.__fk_tab_obj
-
-    @property
-    def fk_cols(self):
-        return self.__fk_col_list
-
-    @property
-    def ref_tab(self):
-        return self.__ref_tab_obj
-
-    @property
-    def ref_cols(self):
-        return self.__ref_col_list
+    def __init__(self, fk_tab_obj, fk_col_list, ref_tab_obj, ref_col_list):
+        self.fk_tab = fk_tab_obj
+        self.fk_cols = fk_col_list
+        assert isinstance(ref_tab_obj, Table), "param `ref_tab_obj` must be a Table object!"
+        self.ref_tab = ref_tab_obj
+        self.ref_cols = ref_col_list
 
 
 class Index:
@@ -247,17 +280,11 @@ class Index:
     - an Index object
     """
 
-    def __init__(self, index_type, index_cols):
-        self.__index_type = index_type
-        self.__index_cols = index_cols
+    __slots__ = ("index_type", "index_cols")
 
-    @property
-    def index_type(self):
-        return self.__index_type
-
-    @property
-    def index_cols(self):
-        return self.__index_cols
+    def __init__(self, index_type, index_cols):
+        self.index_type = index_type
+        self.index_cols = index_cols
 
 
 class Column:
@@ -273,6 +300,8 @@ class Column:
     - a Column object
     """
 
+    __slots__ = ("col_name", "col_type", "is_notnull")
+
     def __init__(
         self,
         col_name,
@@ -280,7 +309,8 @@ class Column:
         is_notnull=False,
     ):
         self.col_name = col_name
-        self.col_type = col_type
+        # a handful of distinct types is shared by millions of columns
+        self.col_type = sys.intern(col_type) if isinstance(col_type, str) else col_type
         self.is_notnull = is_notnull
 
     def is_col_inferred_notnull(self):
@@ -299,7 +329,7 @@ class Column:
         return str_list
 
     def cleansed_col_name(self):
-        return self.col_name.strip('@\'`"[]')
+        return _cleansed_col_name(self.col_name)
 
 
 class Table:
@@ -317,16 +347,38 @@ class Table:
     - a Table object
     """
 
+    __slots__ = (
+        "_tab_name",
+        "_hashid",
+        "_key_list",
+        "_fk_list",
+        "_index_list",
+        "_name2col",
+        "_col_freq_aggregate",
+        "_col_freq_groupby",
+        "_cleansed_tab_name",
+        "_keys_by_type",
+        "_pk_cols_cache",
+        "_unique_cols_cache",
+        "_has_multi_pk_cache",
+    )
+
     def __init__(self, tab_name, hashid, key_list=None, fk_list=None, index_list=None):
         self._tab_name = tab_name
         self._hashid = hashid
         self._key_list = key_list
         self._fk_list = fk_list
         self._index_list = index_list
-        self._name2col = dict()
-        self._col_name_seq = list()  # log the order in which cols are added into the table (leftness etc. matter)
+        self._name2col = dict()  # insertion-ordered, it also logs the order in which cols are added into the table (leftness etc. matter)
         self._col_freq_aggregate = dict()
         self._col_freq_groupby = dict()
+        self._cleansed_tab_name = None
+        self._keys_by_type = dict()  # key_type -> list[Key], filled by `add_key`
+        for key in key_list or ():
+            self._keys_by_type.setdefault(key.key_type, []).append(key)
+        self._pk_cols_cache = None
+        self._unique_cols_cache = None
+        self._has_multi_pk_cache = None
 
     @property
     def tab_name(self):
@@ -360,7 +412,8 @@ class Table:
 
     @property
     def col_name_seq(self):
-        return self._col_name_seq
+        """Column names in the order in which they are added into the table."""
+        return list(self._name2col)
 
     @property
     def col_freq_aggregate(self):
@@ -372,82 +425,104 @@ class Table:
 
     def insert_col(self, col):
         """Insert a new column into the table object."""
-        if col.col_name in self.name2col:
-            # raise Exception(f"col already exists in table: {col.col_name}")
-            return
-        self.name2col[col.col_name] = col
-        
-    def print_for_lm_multi_line(self):
-        file_name = self._hashid
-        table_name = self.cleansed_table_name()
-
-        # if(file_name == '8634986411516259819.sql'):
-        #     debug = 1
+        # an existing col is kept as is
+        self._name2col.setdefault(col.col_name, col)
+
+    def add_key(self, key):
+        """Add a key to the table object and drop the cached key-derived column sets."""
+        self.key_list.append(key)
+        self._keys_by_type.setdefault(key.key_type, []).append(key)
+        self._pk_cols_cache = None
+
+    def _compute_key_sets(self):
+        """Walk the keys once and cache the column names that are [NOTNULL] because of a PK,
+        the single-column unique ones, and whether the table has more than one PK.
+        The caches are reset by `add_key`.
+        """
+        pk_keys = self._keys_by_type.get(KeyKind.PrimaryKey, ())
 
-        # if(file_name == '6400924341428078254.sql'):
-        #     debug = 1
-        components = ['', '', '', '']
-        components[0] = file_name
-        components[1] = utils.convert_camel_to_underscore(table_name)
+        # first populate pk_col_names for [NOTNULL]
+        # if primary key, all columns (even composite) need to be not null (the same is not true for Unique Index per https://stackoverflow.com/questions/386040/whats-wrong-with-nullable-columns-in-composite-primary-keys)
+        pk_col_names_for_notnull = set()
+        for key in pk_keys:
+            pk_col_names_for_notnull.update(key.key_col_names)
 
-        # get keys
+        # next populate unique_key_col_names for [UNIQUE]
         unique_key_col_names_for_unique = set()
-        pk_col_names_for_notnull = set()
-        for key in self.key_list:
-            # first populate unique_key_col_names for [NOTNULL]
-            # if primary key, all columns (even composite) need to be not null (the same is not true for Unique Index per https://stackoverflow.com/questions/386040/whats-wrong-with-nullable-columns-in-composite-primary-keys)
-            if(key.key_type == 'PrimaryKey'):
-                for key_col in key.key_col_list:
-                    pk_col_names_for_notnull.add(key_col.col_name)
-
-            # next populate unique_key_col_names for [UNIQUE]
+        for key_type, keys in self._keys_by_type.items():
             # index does not mean the cols have to be unique, skip
-            if(key.key_type == 'Index'):
-                # print('Index type')
-                continue  # index, do nothing
             # CandidateKey corresponds to "Key" keyword in sql (MySQL), which however does not mean uniqueness (https://stackoverflow.com/questions/924265/what-does-the-key-keyword-mean)
-            if(key.key_type == 'CandidateKey'):
-                # print('CandidateKey')
-                continue  # this does mean the col has to be unique, see 8948003700246411308.sql, table pregled, https://stackoverflow.com/questions/924265/what-does-the-key-keyword-mean
-
+            # see 8948003700246411308.sql, table pregled
             # unique key and unique index may still have NULLs， per https://stackoverflow.com/questions/767657/how-do-i-create-a-unique-constraint-that-also-allows-nulls
-            if(key.key_type == 'UniqueKey' or key.key_type == 'UniqueIndex'):
+            if key_type in NON_UNIQUE_KEY_TYPES:
                 continue
-
-            # other keys with more than one col? then the col itself cannot be assumed unique
-            if(len(key.key_col_list) > 1):
-                continue
-
-            # add the unique columns to unique_key_col_names, so that we can add [UNIQUE] label when we print
-            for key_col in key.key_col_list:
-                if(len(key.key_col_list) > 1):
-                    debug = 1
-                unique_key_col_names_for_unique.add(key_col.col_name)
+            for key in keys:
+                # other keys with more than one col? then the col itself cannot be assumed unique
+                if len(key.key_col_names) > 1:
+                    continue
+                # add the unique columns to unique_key_col_names, so that we can add [UNIQUE] label when we print
+                unique_key_col_names_for_unique.update(key.key_col_names)
 
         # there are cases for SQLLite that may have multiple PK defined on same col,
         # e.g., 4737724513843675438.sql, table `message', which has two PK defined on two cols in the same table
-        all_pks_same_table = [key for key in self.key_list if key.key_type == 'PrimaryKey']
-        has_multiple_pk_on_same_table = len(all_pks_same_table) > 1
+        has_multiple_pk_on_same_table = len(pk_keys) > 1
 
-        # this is equivalent to Column's print_for_lm_components(), though rewritten here
-        col_lm_str_list = list()
-        for col_name in self.col_name_seq:
-            col_obj = self.name2col[col_name]
-            notnull = (col_obj.is_notnull or (col_name in pk_col_names_for_notnull))
-            # only if when there are no >1 PK defined on the same table, we treat such single-col PK as valid for UNIQUE
-            unique = (not has_multiple_pk_on_same_table) and (col_name in unique_key_col_names_for_unique)
+        self._pk_cols_cache = pk_col_names_for_notnull
+        self._unique_cols_cache = unique_key_col_names_for_unique
+        self._has_multi_pk_cache = has_multiple_pk_on_same_table
+
+    def print_for_lm_multi_line(self):
+        file_name = self._hashid
+        # the table name is invariant across the rows, it is turned into a token once
+        table_name = _lm_token(self.cleansed_table_name())
+
+        # if(file_name == '8634986411516259819.sql'):
+        #     debug = 1
 
-            label = '[UNIQUE]' if unique else '[NOTNULL]' if notnull else ''
-            components[2] = utils.convert_camel_to_underscore(col_obj.cleansed_col_name())
-            components[3] = label
+        # if(file_name == '6400924341428078254.sql'):
+        #     debug = 1
 
-            # replace possible ' ' and ',' to '_', to avoid CSV parsing issue
-            # also make sure that all variables are single tokens
-            components[1] = components[1].replace(' ', '_').replace(',', '_')
-            components[2] = components[2].replace(' ', '_').replace(',', '_')
+        if self._pk_cols_cache is None:
+            self._compute_key_sets()
+        pk_col_names_for_notnull = self._pk_cols_cache
+        unique_key_col_names_for_unique = self._unique_cols_cache
+        has_multiple_pk_on_same_table = self._has_multi_pk_cache
 
-            col_lm_str_list.append(','.join(components))
-        return col_lm_str_list
+        # this is equivalent to Column's print_for_lm_components(), though rewritten here
+        # compute the labels and the cleansed names in one pass each,
+        # then emit all the csv rows at once instead of re-filling `components` per column
+        name2col = self._name2col
+        # only if when there are no >1 PK defined on the same table, we treat such single-col PK as valid for UNIQUE
+        unique_col_names = () if has_multiple_pk_on_same_table else unique_key_col_names_for_unique
+        labels = [
+            TOKEN_UNIQUE if col_name in unique_col_names
+            else TOKEN_NOTNULL if (col_obj.is_notnull or col_name in pk_col_names_for_notnull)
+            else TOKEN_EMPTY
+            for col_name, col_obj in name2col.items()
+        ]
+        # make sure that all variables are single tokens
+        cleansed_col_names = [_lm_token(_cleansed_col_name(col_obj.col_name)) for col_obj in name2col.values()]
+
+        # file and table name are the same for every row
+        prefix = f"{file_name},{table_name}"
+        return [f"{prefix},{col_name},{label}" for col_name, label in zip(cleansed_col_names, labels)]
+
+    def write_lm_multi_line(self, out):
+        """Write the rows of `print_for_lm_multi_line` to a binary stream,
+        encoded as one utf-8 chunk per table instead of one write per row.
+
+        Params
+        ------
+        - out: BinaryIO
+
+        Returns
+        -------
+        - None
+        """
+        lines = self.print_for_lm_multi_line()
+        if lines:
+            lines.append('')  # trailing line break
+            out.write('\n'.join(lines).encode('utf-8'))
 
     # def print_for_lm_multi_line(self):
     #     """Generate text for language modeling."""
@@ -472,22 +547,20 @@ class Table:
     #     return col_lm_str_list
 
     def cleansed_table_name(self):
-        """Clean table name."""
-        clean_tab_name = self.tab_name
-        if '.' in clean_tab_name:
-            clean_tab_name = clean_tab_name.split('.')[1]
-        return clean_tab_name.strip('#@\'`"[]')
-
-
-class Pipeline:
-    """Pipeline class for automatically manage queue's in & out."""
-
-    def __init__(self, q_obj):
-        self.q_obj = q_obj
-        self.f_obj_tmp = self.q_obj.popleft()
-
-    def __enter__(self):
-        return self.f_obj_tmp
-
-    def __exit__(self, type, value, traceback):
-        self.q_obj.append(self.f_obj_tmp)
+        """Clean table name (computed once, `tab_name` is read-only)."""
+        if self._cleansed_tab_name is None:
+            clean_tab_name = self.tab_name
+            if '.' in clean_tab_name:
+                clean_tab_name = clean_tab_name.split('.')[1]
+            self._cleansed_tab_name = clean_tab_name.strip(TAB_NAME_STRIP_CHARS)
+        return self._cleansed_tab_name
+
+
+@contextmanager
+def pipeline(q_obj):
+    """Automatically manage queue's in & out: pop the head of the queue and append it back on exit."""
+    f_obj_tmp = q_obj.popleft()
+    try:
+        yield f_obj_tmp
+    finally:
+        q_obj.append(f_obj_tmp)
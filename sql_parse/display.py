@@ -1,141 +1,211 @@
-from pickle import load
-from pprint import pprint
-from random import sample
+import io
+import os
+import sys
+import argparse
+from collections import Counter
+from itertools import islice
+from operator import attrgetter, itemgetter
+from concurrent.futures import ProcessPoolExecutor
 
-from cls_def import *
-from s4_parse_sql import *
-from repo_parse_sql import *
-from parse_join_query import *
-from sample import print_table_obj, print_query_obj, print_fk_obj
+from cls_def import KeyKind, UNIQUE_KEY_TYPES
+from repo_parse_sql import iter_repo_list
+from sample import print_table_obj
+
+
+def aggregate_tables(table_list):
+    """Count the tables, columns, column types and keys of a list of tables.
+    Kept free of any printing so the counting loop stays tight.
+
+    Params
+    ------
+    - table_list: list[Table]
+
+    Returns
+    -------
+    - stats: Counter[str, int]
+    - coltype_freq: Counter[str, int]
+    """
+    # the counters are plain locals while looping, the Counter is only built once at the end
+    total_table_count = not_empty_table_count = total_column_nums = 0
+    total_fk_nums = total_index_nums = 0
+    coltype_freq = Counter()
+    update_coltype_freq = coltype_freq.update
+    get_col_type = attrgetter("col_type")
+    # keys are only classified once for all the tables, from their type frequencies
+    key_type_freq = Counter()
+    update_key_type_freq = key_type_freq.update
+    get_key_type = attrgetter("key_type")
+    for table_object in table_list:
+        total_table_count += 1
+        name2col = table_object.name2col
+        if len(name2col) != 0:
+            total_column_nums += len(name2col)
+            # counted by Counter's C helper, untyped columns are counted under None for now
+            update_coltype_freq(map(get_col_type, name2col.values()))
+            not_empty_table_count += 1
+        total_fk_nums += len(table_object.fk_list)
+        update_key_type_freq(map(get_key_type, table_object.key_list))
+        total_index_nums += len(table_object.index_list)
+    total_pk_nums = key_type_freq[KeyKind.PrimaryKey]
+    total_key_nums = key_type_freq[KeyKind.CandidateKey]
+    total_uniq_nums = sum(key_type_freq[key_type] for key_type in UNIQUE_KEY_TYPES)
+    if None in coltype_freq:
+        coltype_freq["None"] += coltype_freq.pop(None)
+    stats = Counter(
+        total_table_count=total_table_count,
+        not_empty_table_count=not_empty_table_count,
+        total_column_nums=total_column_nums,
+        total_fk_nums=total_fk_nums,
+        total_pk_nums=total_pk_nums,
+        total_key_nums=total_key_nums,
+        total_uniq_nums=total_uniq_nums,
+        total_index_nums=total_index_nums,
+    )
+    return stats, coltype_freq
+
+
+def summarize_repo(args):
+    """Count the objects of a single parsed repo.
+    Repos are independent of each other, so this runs in the worker processes.
+
+    Params
+    ------
+    - args: tuple[int, Repository, bool], (repo index, repo object, verbose)
+
+    Returns
+    -------
+    - stats: Counter[str, int]
+    - coltype_freq: Counter[str, int]
+    - output: str, the repo's printout in verbose mode, else ""
+    """
+    i, repo, verbose = args
+    # per-repo output is collected and written once, and only built at all in verbose mode
+    out = io.StringIO() if verbose else None
+    if verbose:
+        print('-' * 120, file=out)
+        print(f"repo:{i+1}", file=out)
+        print(repo.repo_url, file=out)
+    # total_file_obj_count += len(repo.parsed_file_list)
+
+    join_query_list = repo.join_query_list
+    have_projection_query_nums = have_aggregation_query_nums = 0
+    have_selection_query_nums = have_groupby_query_nums = 0
+    total_binary_join_count = total_condition_count = 0
+    # for case in repo.check_failed_cases:
+    # print(case)
+    for query_obj in join_query_list:
+        projection_dict = query_obj.projection_dict
+        aggregate_dict = query_obj.aggregate_dict
+        selection_dict = query_obj.selection_dict
+        groupby_dict = query_obj.groupby_dict
+        have_projection_query_nums += bool(projection_dict)
+        have_aggregation_query_nums += bool(aggregate_dict)
+        have_selection_query_nums += bool(selection_dict)
+        have_groupby_query_nums += bool(groupby_dict)
+        if verbose:
+            if projection_dict:
+                print(f"projection dict: {projection_dict}", file=out)
+            if aggregate_dict:
+                print(f"aggregate dict: {aggregate_dict}", file=out)
+            if selection_dict:
+                print(f"selection dict: {selection_dict}", file=out)
+            if groupby_dict:
+                print(f"groupby dict: {groupby_dict}", file=out)
+        # print_query_obj(query_obj)
+        total_binary_join_count += len(query_obj)
+        # a query without joins but with projection / aggregate / groupby dicts has `binary_joins` None
+        total_condition_count += sum(len(binary_join.conditions) for binary_join in query_obj.binary_joins or ())
+    stats = Counter(
+        not_empty_count=1,
+        query_count=len(join_query_list),
+        have_projection_query_nums=have_projection_query_nums,
+        have_aggregation_query_nums=have_aggregation_query_nums,
+        have_selection_query_nums=have_selection_query_nums,
+        have_groupby_query_nums=have_groupby_query_nums,
+        total_binary_join_count=total_binary_join_count,
+        total_condition_count=total_condition_count,
+    )
+    table_list = list(repo.name2tab.values())
+    table_stats, coltype_freq = aggregate_tables(table_list)
+    stats.update(table_stats)
+    if verbose:
+        for table_object in table_list:
+            if table_object.name2col:
+                print_table_obj(table_object, f=out)
+                print(file=out)
+            if table_object.fk_list:
+                print(file=out)
+                # for fk in table_object.fk_list:
+                #     print_fk_obj(table_object.tab_name, fk)
+            if table_object.key_list:
+                print(file=out)
+            if table_object.index_list:
+                print(file=out)
+            print(file=out)
+            print(file=out)
+    return stats, coltype_freq, out.getvalue() if verbose else ""
 
 
 if __name__ == "__main__":
-    coltype_freq_dict = dict()
-    coltype_freq_dict["None"] = 0
+    arg_parser = argparse.ArgumentParser(description="Display statistics of the parsed repo list.")
+    # the default can also be switched on from the environment, SQLSCHEMA_VERBOSE=1
+    arg_parser.add_argument(
+        "--verbose", action="store_true", default=os.environ.get("SQLSCHEMA_VERBOSE", "0") == "1",
+        help="also print every query and table object (default: $SQLSCHEMA_VERBOSE == 1)",
+    )
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = arg_parser.parse_args()
+    verbose = args.verbose
+    # the repo printouts are written in large chunks, no need to flush stdout on every newline
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
+
+    stats = Counter()
+    coltype_freq = Counter()
     pickle_fpath = "data/s4_sql_files_parsed/s4_parsed_sql_repo_list_2022_04_19_10:27:56/s4_parsed_sql_repo_list_2022_04_19_10:27:56.pkl"
-    with open(pickle_fpath, "rb") as fp:
-        repo_list = load(fp)
-    # total_file_obj_count = 0
-    not_empty_count = 0
-    total_table_count = 0
-    not_empty_table_count = 0
-    query_count = 0
-    have_fk_table_count = 0
-    have_pk_table_count = 0
-    have_key_table_count = 0
-    total_pk_nums = 0
-    total_fk_nums = 0
-    total_index_nums = 0
-    total_uniq_nums = 0
-    total_key_nums = 0
-    total_join_count = 0
-    total_binary_join_count = 0
-    total_condition_count = 0
-    total_column_nums = 0
-    have_type_column_nums = 0
-    have_projection_query_nums = 0
-    have_aggregation_query_nums = 0
-    have_selection_query_nums = 0
-    have_groupby_query_nums = 0
+    # repos are streamed from the pickle file, only one of them is held in memory at a time
+    repo_list = iter_repo_list(pickle_fpath)
     # repo_list = sample(repo_list, 100)
-    for i, repo in enumerate(repo_list):
-        # filter empty table object
-        if repo is None or (len(repo.name2tab) == 0 and len(repo.join_query_list) == 0):
-            continue
-        print('-' * 120)
-        print(f"repo:{i+1}")
-        print(repo.repo_url)
-        not_empty_count += 1
-        # total_file_obj_count += len(repo.parsed_file_list)
-
-        # if(not_empty_count % 100 == 0):
-        # print(not_empty_count)
-        """
-        if not_empty_table_count > 1000:
-            break
-        """
-        query_count += len(repo.join_query_list)
-        # for case in repo.check_failed_cases:
-        # print(case)
-        # """
-        # """
-        for query_obj in repo.join_query_list:
-            if query_obj.projection_dict:
-                have_projection_query_nums += 1
-                print(f"projection dict: {query_obj.projection_dict}")
-            if query_obj.aggregate_dict:
-                have_aggregation_query_nums += 1
-                print(f"aggregate dict: {query_obj.aggregate_dict}")
-            if query_obj.selection_dict:
-                have_selection_query_nums += 1
-                print(f"selection dict: {query_obj.selection_dict}")
-            if query_obj.groupby_dict:
-                have_groupby_query_nums += 1
-                print(f"groupby dict: {query_obj.groupby_dict}")
-            # print_query_obj(query_obj)
-            total_binary_join_count += len(query_obj)
-            if query_obj.binary_joins:
-                for binary_join in query_obj.binary_joins:
-                    total_condition_count += len(query_obj.binary_joins)
-        # """
-        for table_name, table_object in repo.name2tab.items():
-            total_table_count += 1
-            if len(table_object.name2col) != 0:
-                total_column_nums += len(table_object.name2col)
-                for cname, cobj in table_object.name2col.items():
-                    if cobj.col_type is not None:
-                        have_type_column_nums += 1
-                        if cobj.col_type not in coltype_freq_dict:
-                            coltype_freq_dict[cobj.col_type] = 0
-                        coltype_freq_dict[cobj.col_type] += 1
-                    else:
-                        coltype_freq_dict["None"] += 1
-                        # print(table_name)
-                print_table_obj(table_object)
-                print()
-                # print(table_object.name2col)
-                not_empty_table_count += 1
-            # """
-    # print(f"{}")
+    # filter empty table object
+    tasks = (
+        (i, repo, verbose) for i, repo in enumerate(repo_list)
+        if not (repo is None or repo.is_empty)
+    )
+
+    def reduce_results(results):
+        for repo_stats, repo_coltype_freq, output in results:
+            stats.update(repo_stats)
+            coltype_freq.update(repo_coltype_freq)
+            if output:
+                sys.stdout.write(output)
+
+    if args.workers > 1:
+        # repos are independent, farm them out to worker processes;
+        # submit them batch by batch to keep the streaming of the pickle file
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            while batch := list(islice(tasks, args.workers * 64)):
+                reduce_results(executor.map(summarize_repo, batch, chunksize=16))
+    else:
+        reduce_results(map(summarize_repo, tasks))
+
+    not_empty_count = stats["not_empty_count"]
+    total_table_count = stats["total_table_count"]
+    not_empty_table_count = stats["not_empty_table_count"]
+    query_count = stats["query_count"]
+    total_pk_nums = stats["total_pk_nums"]
+    total_fk_nums = stats["total_fk_nums"]
+    total_index_nums = stats["total_index_nums"]
+    total_uniq_nums = stats["total_uniq_nums"]
+    total_key_nums = stats["total_key_nums"]
+    total_binary_join_count = stats["total_binary_join_count"]
+    total_condition_count = stats["total_condition_count"]
+    total_column_nums = stats["total_column_nums"]
+    have_projection_query_nums = stats["have_projection_query_nums"]
+    have_aggregation_query_nums = stats["have_aggregation_query_nums"]
+    have_selection_query_nums = stats["have_selection_query_nums"]
+    have_groupby_query_nums = stats["have_groupby_query_nums"]
     # print("avg binary join in each query:", total_binary_join_count / query_count)
     # print("avg condition in each query:", total_condition_count / query_count)
-    # """
-            if table_object.fk_list:
-                print()
-                for fk in table_object.fk_list:
-                    total_fk_nums += 1
-                    # print(f"fk_cols: {fk.fk_cols} | ref_table: {fk.ref_tab} | ref_cols: {fk.ref_cols}")
-                    # print_fk_obj(table_object.tab_name, fk)
-                    # print()
-                # have_fk_table_count += 1
-            if table_object.key_list:
-                print()
-                for key in table_object.key_list:
-                    if key.key_type == "PrimaryKey":
-                        total_pk_nums += 1
-                        # have_pk_table_count += 1
-                    elif key.key_type == "CandidateKey":
-                        total_key_nums += 1
-                    elif "Unique" in key.key_type:
-                        total_uniq_nums += 1
-                    # print(f"key_type: {key.key_type} | key_col_list: {key.key_col_list}")
-                # have_key_table_count += 1
-            if table_object.index_list:
-                print()
-                for idx in table_object.index_list:
-                    total_index_nums += 1
-            print()
-            print()
-    # """
-    # print(f"table_name: {table_name}")
-    # if table_object.fk_list:
-    # print(repo.repo_url)
-    # for fk in table_object.fk_list:
-    # print_fk_obj(fk)
-    # """
-    # pprint(table_object.fk_list)  # print fk list in table
-    # pprint(table_object.key_list)  # print key list in table
-    # pprint(table_object.name2col)  # print column list in table
+    have_type_column_nums = total_column_nums - coltype_freq["None"]
     print(f"Totally not empty repo: {not_empty_count}")
     # print(f"Totally file object nums: {total_file_obj_count}")
     print(f"Totally table count: {total_table_count}")
@@ -157,6 +227,6 @@ if __name__ == "__main__":
     print(f"Totally column nums with type: {have_type_column_nums}")
     print()
 
-    # coltype_freq_dict = {k: v for k, v in sorted(coltype_freq_dict.items(), key=lambda item: item[1], reverse=True)}
-    # for col, freq in coltype_freq_dict.items():
-    # print(col, freq)
+    if verbose:
+        for col, freq in sorted(coltype_freq.items(), key=itemgetter(1), reverse=True):
+            print(col, freq)
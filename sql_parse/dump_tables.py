@@ -1,13 +1,32 @@
-from pickle import load
-from pprint import pprint
-from random import sample
+import io
+import os
+from itertools import islice
+from multiprocessing import Pool
+
+from repo_parse_sql import iter_repo_list
+
+# progress lines are only printed with SQLSCHEMA_VERBOSE=1
+VERBOSE = os.environ.get("SQLSCHEMA_VERBOSE", "0") == "1"
+vprint = print if VERBOSE else (lambda *a, **k: None)
+
+
+def dump_repo_tables(repo):
+    """Format the LM csv lines of all the tables in a repo.
+    Repos are independent of each other, so this runs in the worker processes.
+
+    Params
+    ------
+    - repo: Repository
+
+    Returns
+    -------
+    - bytes, the repo's csv lines, utf-8 encoded
+    """
+    buf = io.BytesIO()
+    for table_object in repo.name2tab.values():
+        table_object.write_lm_multi_line(buf)
+    return buf.getvalue()
 
-from cls_def import *
-from s4_parse_sql import *
-from repo_parse_sql import *
-from parse_join_query import *
-from sample import print_table_obj, print_query_obj, print_fk_obj
-import utils
 
 # effectively replaces the print_multiline_lm() func from orig code
 if __name__ == "__main__":
@@ -16,22 +35,17 @@ if __name__ == "__main__":
     pickle_fpath = "/datadrive/yang/exp/data/s4_sql_files_parsed/s4_parsed_sql_repo_list_2022_04_08_15:07:33/s4_parsed_sql_repo_list_2022_04_08_15:07:33_8.pkl"
     #pickle_fpath = "/datadrive/yang/exp/data/s4_sql_files_parsed/s4_parsed_sql_repo_list_2022_04_11_13:10:55/s4_parsed_sql_repo_list_2022_04_11_13:10:55.pkl"
     output_csv = os.path.join('/datadrive/yeye', pickle_fpath.split('/')[-1] + ".csv")
-    with open(output_csv, "w") as writer:
-        with open(pickle_fpath, "rb") as fp:
-            repo_list = load(fp)
-        for i, repo in enumerate(repo_list):
-            # filter empty table object
-            if repo is None or (len(repo.name2tab) == 0 and len(repo.join_query_list) == 0):
-                continue
-
-
-            if(i % 1000 == 0):
-                print (i)
-                
-            for table_name in repo.name2tab:
-                table_object =  repo.name2tab[table_name]
-                lines = table_object.print_for_lm_multi_line()
-                
-                for l in lines:
-                    writer.write(l + '\n')
-
+    workers = os.cpu_count()
+    # filter empty table object
+    repo_list = (repo for repo in iter_repo_list(pickle_fpath) if not (repo is None or repo.is_empty))
+    # each repo is written as one block, a 1 MiB buffer batches them into few large writes
+    with open(output_csv, "wb", buffering=1 << 20) as writer, Pool(processes=workers) as pool:
+        i = 0
+        # submit the repos batch by batch to keep the streaming of the pickle file,
+        # `imap` keeps the output in the same order as the serial loop
+        while batch := list(islice(repo_list, workers * 64)):
+            for repo_lines in pool.imap(dump_repo_tables, batch, chunksize=16):
+                if(i % 1000 == 0):
+                    vprint(i)
+                writer.write(repo_lines)
+                i += 1
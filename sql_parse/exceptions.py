@@ -11,58 +11,56 @@ This module contains the set of sql_parse's exceptions.
 """
 
 
-from inspect import getframeinfo, stack
+import sys
 
 
 # Self-defined Errors / Exceptions
 
 class SQLParseError(Exception):
-    """An ambiguous exception that occurred while parsing SQL statements."""
+    """An ambiguous exception that occurred while parsing SQL statements.
+    The message is prefixed with the file and line where the error is raised;
+    subclasses only set their own `DEFAULT_MSG`.
+    """
+
+    DEFAULT_MSG = "SQL parse error!"
+
+    def __init__(self, msg=None):
+        if msg is None:
+            msg = self.DEFAULT_MSG
+        # only the caller's frame is needed, `inspect.stack()` would build (and read the source of) every frame
+        last_frame = sys._getframe(1)
+        self.msg = f"{last_frame.f_code.co_filename}:{last_frame.f_lineno}, {msg}"
+        super().__init__(self.msg)
 
 
 class ParseStageFailedError(SQLParseError):
     """A parse stage failed error occurred."""
 
-    def __init__(self, msg="Parse stage failed error!"):
-        last_frame_info = getframeinfo(stack()[1][0])
-        self.msg = f"{last_frame_info.filename}:{last_frame_info.lineno}, {msg}"
-        super().__init__(self.msg)
+    DEFAULT_MSG = "Parse stage failed error!"
 
 
 class RegexMatchError(SQLParseError):
     """A regex match failed error occurred."""
 
-    def __init__(self, msg="Regex match error!"):
-        last_frame_info = getframeinfo(stack()[1][0])
-        self.msg = f"{last_frame_info.filename}:{last_frame_info.lineno}, {msg}"
-        super().__init__(self.msg)
+    DEFAULT_MSG = "Regex match error!"
 
 
 class DefColumnError(SQLParseError):
     """A column definition error occurred."""
 
-    def __init__(self, msg="Column definition error!"):
-        last_frame_info = getframeinfo(stack()[1][0])
-        self.msg = f"{last_frame_info.filename}:{last_frame_info.lineno}, {msg}"
-        super().__init__(self.msg)
+    DEFAULT_MSG = "Column definition error!"
 
 
 class RefUnfoundError(SQLParseError):
     """A references unfound error occurred."""
 
-    def __init__(self, msg="Unfound references error!"):
-        last_frame_info = getframeinfo(stack()[1][0])
-        self.msg = f"{last_frame_info.filename}:{last_frame_info.lineno}, {msg}"
-        super().__init__(self.msg)
+    DEFAULT_MSG = "Unfound references error!"
 
 
 class UnknownVariantError(SQLParseError):
     """An unknown or unhandled variant error occurred."""
 
-    def __init__(self, msg="Unknown / Unhandled variant error!"):
-        last_frame_info = getframeinfo(stack()[1][0])
-        self.msg = f"{last_frame_info.filename}:{last_frame_info.lineno}, {msg}"
-        super().__init__(self.msg)
+    DEFAULT_MSG = "Unknown / Unhandled variant error!"
 
 
 # Self-defined Warnings
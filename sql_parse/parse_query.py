@@ -10,10 +10,15 @@ import logging
 from random import sample
 from pprint import pprint
 from functools import lru_cache
+from collections import ChainMap
+from itertools import chain, islice, pairwise
+from operator import itemgetter
 
-from Levenshtein import distance
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein as levenshtein
 from sql_metadata import Parser
 from sqlparse import parse
+from sqlparse import tokens as T
 from sqlparse.sql import (
     Token,
     TokenList,
@@ -26,7 +31,6 @@ from sqlparse.sql import (
 )
 
 from utils import (
-    Timeout,
     fmt_str,
     query_stmt_split,
     split_string,
@@ -36,6 +40,121 @@ from utils import (
 
 AGG_FUNC_LIST = ["count", "sum", "max", "min", "avg"]
 
+# compiled once at import instead of going through `re`'s pattern cache on every call
+# `table alias` or a bare `table`, folded into one pattern with an optional alias: the same matches as
+# the alternation "(?:\w+\.\w+|\w+)\s+\w+|(?:\w+\.\w+|\w+)", without rescanning a table that has no alias
+TABLE_ALIAS_REGEX = re.compile(r"(?:\w+\.\w+|\w+)(?:\s+\w+)?", re.IGNORECASE)
+AS_SPLIT_REGEX = re.compile(" as | AS | As | aS ")
+AND_SPLIT_REGEX = re.compile(" and | AND | And ")
+OR_SPLIT_REGEX = re.compile(" or | OR | Or | oR ")
+# str.lower() only maps the ASCII letters to "select"
+SELECT_REGEX = re.compile("select", re.IGNORECASE | re.ASCII)
+
+# how `_extract_conditions` handles a token, looked up by its exact sqlparse class
+CMP_TOKEN, WHERE_TOKEN, GROUP_TOKEN = range(3)
+CONDITION_TOKEN_KINDS = {
+    Comparison: CMP_TOKEN,
+    Where: WHERE_TOKEN,
+    Parenthesis: GROUP_TOKEN,
+    Function: GROUP_TOKEN,
+}
+
+# bits of `_get_statement_features`, the keywords that route a statement to the join/where parses
+HAS_SELECT, HAS_JOIN, HAS_WHERE = 1, 2, 4
+SELECT_JOIN = HAS_SELECT | HAS_JOIN
+SELECT_WHERE = HAS_SELECT | HAS_WHERE
+
+logger = logging.getLogger(__name__)
+
+
+# prefixes of the spellings built by `_normalize_table_name`, in the order they are tried
+STRIP_BRACKETS = str.maketrans('', '', "[]")
+UNBRACKETED_PREFIXES = ('', '#', '@', "public.", "#public.", "mydb.")
+BRACKETED_PREFIXES = ('#', '@', "[dbo].", "#[dbo].")
+SQUARE_PREFIXES = ('', "[dbo].", "#[dbo].")
+PLAIN_PREFIXES = ("public.", "#public.", '#', '@', "dbo.", "mydb.")
+
+
+@lru_cache(maxsize=8192)
+def _normalize_table_name(s):
+    """All the spellings a table name may have been defined with, the name itself first."""
+    if '[' in s and ']' in s:
+        s_without_square = s.translate(STRIP_BRACKETS)
+        head = (s, s.rpartition('.')[2]) if '.' in s else (s,)
+        return head + tuple(p + s_without_square for p in UNBRACKETED_PREFIXES) + tuple(p + s for p in BRACKETED_PREFIXES)
+    if '.' in s:
+        s_square = '[' + s.replace('.', "][") + ']'
+        head = (s, s.partition('.')[2])
+    else:
+        s_square = '[' + s + ']'
+        head = (s,)
+    return head + tuple(p + s_square for p in SQUARE_PREFIXES) + tuple(p + s for p in PLAIN_PREFIXES)
+
+
+@lru_cache(maxsize=8192)
+def _normalize_column_name(s):
+    """All the spellings a column name may have been defined with, the name itself first."""
+    l = list()
+    l.append(s)
+    if all(i in s for i in ('[', ']')):
+        s_without_square = s.replace('[', '').replace(']', '')
+        l.append(s_without_square)
+    else:
+        s_with_square = '[' + s + ']'
+        l.append(s_with_square)
+    return tuple(l)
+
+
+@lru_cache(maxsize=512)
+def _get_metadata_parser(stmt):
+    """The `Parser` of a statement, shared by all the helpers that parse the same statement
+    (and by every column looked up in the same sub-query).
+    `Parser` memoizes its properties, so the statement is only tokenized once; the
+    returned parser and the lists it returns are only read from, never modified.
+    """
+    return Parser(stmt)
+
+
+@lru_cache(maxsize=1024)
+def _get_subquery_column2table(subquery):
+    """Column name -> table name of the qualified columns a sub-query selects, the first table wins.
+    Shared by every outter join condition on the same sub-query; the returned dict is only read.
+    """
+    subquery_metadata = _get_metadata_parser(subquery)
+    column2table = dict()
+    try:
+        projections = subquery_metadata.columns_dict["select"]
+    except:
+        return column2table
+    for col in projections:
+        tab_name, sep, col_name = col.rpartition('.')
+        if sep:
+            column2table.setdefault(col_name, tab_name)
+    return column2table
+
+
+def _get_statement_features(stmt):
+    """Bitmap of the `HAS_*` keywords found in `stmt`, lowered only once."""
+    s = stmt.lower()
+    return ("select" in s) | ("join" in s) << 1 | ("where" in s) << 2
+
+
+@lru_cache(maxsize=1024)
+def _parse_statements(stmt):
+    """The `sqlparse` statements of `stmt`, shared like `_get_metadata_parser`.
+    The whole input of `QueryParser.parse` goes through here too, so a single-select query whose
+    statement is the input itself is only parsed once, and a statement repeated across the files of
+    a repo (each parsed by its own `QueryParser`) is only parsed the first time.
+    The cache is keyed on the exact text: the token values keep the statement's case and spacing.
+    The returned token trees are handed to every later caller, they must never be modified.
+    """
+    return tuple(parse(stmt))
+
+
+def _get_parsed_statement(stmt):
+    """The first `sqlparse` statement of `stmt`."""
+    return _parse_statements(stmt)[0]
+
 
 class TableInstance:
     """Construct different table objects
@@ -52,25 +171,11 @@ class TableInstance:
     - table_obj: Table
     """
 
-    def __init__(self, table_name, table_obj):
-        self.__table_name = table_name
-        self.__table_obj = table_obj
+    __slots__ = ("table_name", "table_obj")
 
-    @property
-    def table_name(self):
-        return self.__table_name
-
-    @table_name.setter
-    def table_name(self, name):
-        self.__table_name = name
-
-    @property
-    def table_obj(self):
-        return self.__table_obj
-
-    @table_obj.setter
-    def table_obj(self, obj):
-        self.__table_obj = obj
+    def __init__(self, table_name, table_obj):
+        self.table_name = table_name
+        self.table_obj = table_obj
 
 
 class BinaryJoin:
@@ -87,52 +192,50 @@ class BinaryJoin:
     ------
     - table_a: TableInstance
     - table_b: TableInstance
-    - conditions: list[tuple[Column, str, Column]]
-      a list of binary operation tuples, each tuple
+    - conditions: Sequence[tuple[Column, str, Column]]
+      a sequence of binary operation tuples, each tuple
       includes three member: table_a's column, op and table_b's column.
+      Conditions are added with `add_condition`.
     """
 
+    __slots__ = ("table_a", "table_b", "_conditions", "join_type")
+
     def __init__(
         self,
         table_a,
         table_b,
     ):
-        self.__table_a_obj = table_a
-        self.__table_b_obj = table_b
-        self.__condition_list = list()
-        self.__join_type = "inner"
-
-    @property
-    def table_a(self):
-        return self.__table_a_obj
-
-    @table_a.setter
-    def table_a(self, table_a):
-        self.__table_a_obj = table_a
-
-    @property
-    def table_b(self):
-        return self.__table_b_obj
-
-    @table_b.setter
-    def table_b(self, table_b):
-        self.__table_b_obj = table_b
+        self.table_a = table_a
+        self.table_b = table_b
+        # most joins have a single condition: None, then that condition's tuple,
+        # and a list is only allocated from the second condition on
+        self._conditions = None
+        self.join_type = "inner"
 
     @property
     def conditions(self):
-        return self.__condition_list
+        conditions = self._conditions
+        if conditions is None:
+            return ()
+        if type(conditions) is tuple:
+            return (conditions,)
+        return conditions
 
     @conditions.setter
-    def conditions(self, l):
-        self.__condition_list = l
-
-    @property
-    def join_type(self):
-        return self.__join_type
-
-    @join_type.setter
-    def join_type(self, join_type):
-        self.__join_type = join_type
+    def conditions(self, conditions):
+        self._conditions = None
+        for l_col, op, r_col in conditions:
+            self.add_condition(l_col, op, r_col)
+
+    def add_condition(self, l_col, op, r_col):
+        condition = (l_col, op, r_col)
+        conditions = self._conditions
+        if conditions is None:
+            self._conditions = condition
+        elif type(conditions) is tuple:
+            self._conditions = [conditions, condition]
+        else:
+            conditions.append(condition)
 
 
 class Query:
@@ -152,141 +255,101 @@ class Query:
     - selection_cols: dict[Table:list[Tuple[?]]]
     """
 
+    __slots__ = ("binary_joins", "projection_dict", "aggregate_dict", "selection_dict", "groupby_dict")
+
     def __init__(self, binary_join_list, projection_dict, aggregate_dict, selection_dict, groupby_dict):
-        self.__binary_join_list = binary_join_list
-        self.__projection_dict = projection_dict
-        self.__aggregate_dict = aggregate_dict
-        self.__selection_dict = selection_dict
-        self.__groupby_dict = groupby_dict
+        self.binary_joins = binary_join_list
+        self.projection_dict = projection_dict
+        self.aggregate_dict = aggregate_dict
+        self.selection_dict = selection_dict
+        self.groupby_dict = groupby_dict
 
     def __len__(self):
-        if self.__binary_join_list:
-            return len(self.__binary_join_list)
-        elif self.__projection_dict:
-            return len(self.__projection_dict)
-        elif self.__aggregate_dict:
-            return len(self.__aggregate_dict)
-        elif self.__selection_dict:
-            return len(self.__selection_dict)
-        elif self.__groupby_dict:
-            return len(self.__groupby_dict)
-
-    @property
-    def binary_joins(self):
-        return self.__binary_join_list
-
-    @binary_joins.setter
-    def binary_joins(self, l):
-        # if not isinstance(l, list):
-            # raise TypeError("Could only assign attrib `binary_joins` with a list object!")
-        self.__binary_join_list = l
-
-    @property
-    def aggregate_dict(self):
-        # if self.__aggregate_dict is None:
-            # self.__aggregate_dict = dict()
-        return self.__aggregate_dict
-
-    @property
-    def groupby_dict(self):
-        # if self.__groupby_dict is None:
-            # self.__groupby_dict = dict()
-        return self.__groupby_dict
-
-    @property
-    def projection_dict(self):
-        # if self.__projection_dict is None:
-            # self.__projection_dict = dict()
-        return self.__projection_dict
-
-    @property
-    def selection_dict(self):
-        # if self.__selection_dict is None:
-            # self.__selection_dict = dict()
-        return self.__selection_dict
+        if self.binary_joins:
+            return len(self.binary_joins)
+        elif self.projection_dict:
+            return len(self.projection_dict)
+        elif self.aggregate_dict:
+            return len(self.aggregate_dict)
+        elif self.selection_dict:
+            return len(self.selection_dict)
+        elif self.groupby_dict:
+            return len(self.groupby_dict)
 
 
 class QueryNode:
     """Query Node class"""
 
-    def __init__(self, token, parent=None):
-        self.__token = token
-        self.__parent = parent
-        self.__children = list()
-        self.__statement = self._normalize(token.value)
-        self.__tables = list()
-        self.__alias2table = dict()
-        self.__limit_cols = list()
-        self.__sub_query_list = list()
-        self.__join_type = "inner"
-
-    def _normalize(self, s):
-        return s[1:-1].strip() if s[0] == '(' and s[-1] == ')' else s.strip()
+    __slots__ = (
+        "token", "_parent", "children", "statement", "tables",
+        "_alias2table", "limit_cols", "sub_query_list", "join_type", "_scope", "_features",
+    )
 
-    @ property
-    def token(self):
-        return self.__token
+    def __init__(self, token, parent=None):
+        self.token = token
+        self._parent = parent
+        self.children = list()
+        self.statement = self._normalize(token.value)
+        self.tables = list()
+        self._alias2table = dict()
+        self._scope = None
+        self._features = None
+        self.limit_cols = list()
+        self.sub_query_list = list()
+        self.join_type = "inner"
 
-    @ property
+    @property
     def parent(self):
-        return self.__parent
+        return self._parent
 
-    @ parent.setter
-    def parent(self, p):
-        self.__parent = p
-
-    @ property
-    def children(self):
-        return self.__children
-
-    @ property
-    def statement(self):
-        return self.__statement
+    @parent.setter
+    def parent(self, node):
+        self._parent = node
+        self._invalidate_scope()
 
-    @ property
-    def tables(self):
-        return self.__tables
-
-    @ tables.setter
-    def tables(self, t):
-        self.__tables = t
-
-    @ property
+    @property
     def alias2table(self):
-        return self.__alias2table
-
-    @ alias2table.setter
-    def alias2table(self, d):
-        self.__alias2table = d
-
-    @ property
-    def limit_cols(self):
-        return self.__limit_cols
+        return self._alias2table
 
-    @ limit_cols.setter
-    def limit_cols(self, l):
-        self.__limit_cols = l
+    @alias2table.setter
+    def alias2table(self, alias2table):
+        self._alias2table = alias2table
+        self._invalidate_scope()
 
     @property
-    def sub_query_list(self):
-        return self.__sub_query_list
-
-    @sub_query_list.setter
-    def sub_query_list(self, l):
-        self.__sub_query_list = l
+    def scope(self):
+        """Alias -> table name of this node and all its ancestors, the nearest definition wins.
+        Flattened on first use and kept until an `alias2table` or `parent` on the path is reassigned
+        (the `alias2table` dicts are not mutated once assigned).
+        """
+        if self._scope is None:
+            self._scope = self._parent.scope | self._alias2table if self._parent is not None else dict(self._alias2table)
+        return self._scope
 
     @property
-    def join_type(self):
-        return self.__join_type
+    def features(self):
+        """`_get_statement_features` of the node's statement, computed on first use (the statement never changes)."""
+        if self._features is None:
+            self._features = _get_statement_features(self.statement)
+        return self._features
+
+    def _invalidate_scope(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._scope = None
+            stack.extend(node.children)
 
-    @join_type.setter
-    def join_type(self, join_type):
-        self.__join_type = join_type
+    def _normalize(self, s):
+        return s[1:-1].strip() if s.startswith('(') and s.endswith(')') else s.strip()
 
 
 class QueryTree:
     """Query Tree class"""
 
+    # the slot name is mangled like the attribute, to `_QueryTree__root`
+    __slots__ = ("__root",)
+
     def __init__(self, root):
         self.__root = root
 
@@ -313,19 +376,38 @@ class TokenVisitor:
     def get_parent(self, token):
         return self.curr.parent
 
+    # token class -> handler, resolved once per token class by `visit`;
+    # each visitor class gets its own table, so a lookup needs no (visitor, token) key tuple
+    _handlers = dict()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handlers = dict()
+
     def visit(self, token):
-        # method = "visit_" + type(token).__name__
-        method = type(token).__name__
-        visitor = getattr(self, method, self.generic_visit)
-        print(method)
+        token_cls = type(token)
+        visitor = self._handlers.get(token_cls)
+        if visitor is None:
+            # method = "visit_" + type(token).__name__
+            method = token_cls.__name__
+            visitor = self._handlers[token_cls] = getattr(type(self), method, type(self).generic_visit)
+        # print(method)
         # print(visitor)
-        return visitor(token)
+        return visitor(self, token)
+
+    # leaf token types the visitors have nothing to do with, `generic_visit` does not dispatch them;
+    # a visitor that needs the full token stream sets this to an empty frozenset
+    skip_ttypes = frozenset({T.Whitespace, T.Newline, T.Punctuation})
 
     def generic_visit(self, token):
         if not isinstance(token, TokenList):
             return
-        for tk in token:
-            self.visit(tk)
+        skip_ttypes = self.skip_ttypes
+        visit = self.visit
+        for tk in token.tokens:
+            if tk.ttype in skip_ttypes:
+                continue
+            visit(tk)
 
     def get_all_select_tokens(self):
 
@@ -337,47 +419,55 @@ class TokenVisitor:
 
         # append SELECT clause followed by `INTERSECT`
         token_select = list()
-        tokens = self.get_all_tokens()
-        token_select = [t.parent for t in tokens if t.value.lower() == "select" and str(t.ttype) == "Token.Keyword.DML"]
+        # the token stream flattened once in `__init__`; the SELECT keywords are found in a single pass,
+        # on the (singleton) token type first, and shared with the fallback below
+        select_keywords = [t for t in self.tokens if t.ttype is T.Keyword.DML and t.value.lower() == "select"]
+        token_select = [t.parent for t in select_keywords]
         """
         token_select = [t.parent for t in tokens if t.value.lower() == "select" and str(t.ttype) == "Token.Keyword.DML"
                         and t.parent is not None and ("join" in t.parent.value.lower() or "where" in t.parent.value.lower())]
         """
         # token_select = [t.parent for t in tokens if __is_join_query_stmt(t)]
         if not token_select:
-            token_select = list(set([t.parent.parent for t in tokens if t.value.lower() == "select"
-                                     and str(t.ttype) == "Token.Keyword.DML" and __is_join_query_stmt(t.parent)]))
+            token_select = list(dict.fromkeys([t.parent.parent for t in select_keywords if __is_join_query_stmt(t.parent)]))
 
         return token_select
 
     def get_tables(self, token):
         res = dict()
         try:
-            meta_parser = Parser(token.value)
+            meta_parser = _get_metadata_parser(token.value)
         except:
             pass
         else:
             tables = meta_parser.tables
             res |= {t: t for t in tables if t not in res}
         for d in self._get_tables(token):
-            if fmt_str(d["alias"]) != "":
-                res[fmt_str(d["alias"])] = fmt_str(d["table"])
+            if alias := fmt_str(d["alias"]):
+                res[alias] = fmt_str(d["table"])
         self._get_tables_patch(token, res)
         return res
 
-    def _get_tables(self, token, i=None):
-        i = token if i is None else i
-        flag = False
-        for i in getattr(i, "tokens", []):
-            if isinstance(i, Token) and i.value.lower() == "from" or "join" in i.value.lower():
-                flag = True
-            elif isinstance(i, (Identifier, IdentifierList)) and flag:
-                flag = False
+    def _get_tables(self, token):
+        # pre-order walk of the token tree with an explicit stack instead of recursive generators;
+        # each stack frame is [iterator over a token list's children, whether a FROM / JOIN was just seen there]
+        stack = [[iter(getattr(token, "tokens", [])), False]]
+        while stack:
+            frame = stack[-1]
+            i = next(frame[0], None)
+            if i is None:
+                stack.pop()
+                continue
+            value_lower = i.value.lower()
+            if isinstance(i, Token) and value_lower == "from" or "join" in value_lower:
+                frame[1] = True
+            elif isinstance(i, (Identifier, IdentifierList)) and frame[1]:
+                frame[1] = False
                 if not any(isinstance(x, Parenthesis) or 'select' in x.value.lower() for x in getattr(i, 'tokens', [])):
                     fr = ''.join(str(j) for j in i if j.value.lower() not in {'as', '\n'})
-                    for t in re.findall('(?:\w+\.\w+|\w+)\s+\w+|(?:\w+\.\w+|\w+)', fr, re.IGNORECASE):
+                    for t in TABLE_ALIAS_REGEX.findall(fr):
                         yield {'table': (t1 := t.split())[0], 'alias': None if len(t1) < 2 else t1[-1]}
-            yield from self._get_tables(i)
+            stack.append([iter(getattr(i, "tokens", [])), False])
 
     def _get_tables_patch(self, token, res):
         tokens = token.tokens
@@ -404,7 +494,7 @@ class TokenVisitor:
                             if pair not in res:
                                 res[pair] = pair
             # """
-            elif "tokens" in dir(t):
+            elif isinstance(t, TokenList):
                 self._get_tables_patch(t, res)
 
 
@@ -423,120 +513,150 @@ class QueryParser:
         self.limit_cols_level = list()
         self.binary_join_list = list()
         self.condition_list = list()
+        self._condition_seen = set()  # the normalized conditions already in `condition_list`
         self.raw_condition_list = list()
+        # the raw lists of the other clauses are only filled by their extractors, which not every query reaches
+        self.raw_projection_list = list()
+        self.raw_aggregate_list = list()
+        self.raw_selection_list = list()
+        self.raw_groupby_list = list()
         self.name2tab = name2tab
+        # lowered table name / last token of a dotted table name -> (table name, Table), see `_get_last_token2name_tab`
+        self._last_token2name_tab = dict()
+        self._last_token2name_tab_size = 0
+        self._table_definition_cache = dict()  # table name -> result of `_check_table_definition`
+        # lowered table name -> (table name, Table), see `_get_lower2name2tab`
+        self._lower2name2tab = dict()
+        self._lower2name2tab_with_last_token = dict()
+        self._lower2name2tab_size = 0
+        self._lower2colname_cache = dict()  # id(name2col) -> see `_get_lower2colname_entry`
         # self.user_name2tab = user_name2tab
         # self.lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
         # self.lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()}
         self.only_two_join_tables = False
         self.single_query = False
-        self.check_failed_cases = list()  # [(failed_condition, statement, dictionary)]
-        self.unfound_tables = list()
+        # (failed_condition, reason) -> (failed_condition, reason, statement, dictionary), only the first occurrence is kept
+        self._check_failed_cases = dict()
+        self.unfound_tables = dict()  # unfound table name -> None, an insertion-ordered set
         self.aggregate_dict = dict()
         self.groupby_dict = dict()
         self.projection_dict = dict()
         self.selection_dict = dict()
 
-    def _remove_duplicate_condition(self):
-        self.binary_join_list = list(set(self.binary_join_list))
-
     def _has_sub_query(self, token):
         return token.is_keyword and token.value.lower() == "select"
 
     def _get_all_sub_query(self, select_tokens):
-        p_tokens = [t.parent.value for t in select_tokens if t.parent is not None]
+        # consumed once by the comprehension below, no intermediate list is built
+        p_tokens = (t.parent.value for t in select_tokens if t.parent is not None)
         # pp_tokens = [t.parent.value for t in p_tokens if t.parent is not None]
         # ppp_tokens = [t.parent.value for t in pp_tokens if t.parent is not None]
-        select_clauses = list()
-        all_clauses = p_tokens
-        for c in all_clauses:
-            if c[0] == '(' and c[-1] == ')':
-                select_clauses.append(c[1:-1])
-            else:
-                select_clauses.append(c)
-        return select_clauses
+        # startswith / endswith, unlike indexing, also copes with an empty clause
+        return [c[1:-1] if c.startswith('(') and c.endswith(')') else c for c in p_tokens]
 
-    def _get_likely_strs(self, s, m):
+    def _get_likely_strs(self, s, m, limit=None):
+        """Rank the keys of `m` by their edit distance to `s`, returns [(distance, key)] sorted by distance.
+        With `limit`, only that many of the closest keys are ranked and returned.
+        """
         # d = 999
         # likely_strs = list()
-        d_str_pairs = list()
-        for t_name, _ in m.items():
-            d_str_pair = (distance(s, t_name), t_name)
-            d_str_pairs.append(d_str_pair)
-        sorted_d = sorted(d_str_pairs, key=lambda t: t[0])
+        # all the distances are computed (and sorted, ascending) in rapidfuzz's C loop rather than pair by pair,
+        # with a `limit` only the closest keys are kept and sorted
+        sorted_d = [(d, t_name) for t_name, d, _ in process.extract(s, tuple(m), scorer=levenshtein.distance, limit=limit)]
         # return likely_str
         return sorted_d
 
-    def _check_table_definition(self, table_name, col_name):
-
-        def __normalize(s):
-            l = list()
-            l.append(s)
-            if all(i in s for i in ('[', ']')):
-                if '.' in s:
-                    l.append(s.rsplit('.', 1)[1])
-                s_without_square = s.replace('[', '').replace(']', '')
-                l.append(s_without_square)
-                l.append("#" + s_without_square)
-                l.append("@" + s_without_square)
-                l.append("public." + s_without_square)
-                l.append("#public." + s_without_square)
-                l.append("mydb." + s_without_square)
-                l.append("#" + s)
-                l.append("@" + s)
-                l.append("[dbo]." + s)
-                l.append("#[dbo]." + s)
-            elif '.' in s:
-                s_square = "".join(['[' + i + ']' for i in s.split('.')])
-                l.append(s.split('.', 1)[1])
-                l.append(s_square)
-                l.append("[dbo]." + s_square)
-                l.append("#[dbo]." + s_square)
-                l.append("public." + s)
-                l.append("#public." + s)
-                l.append("#" + s)
-                l.append("@" + s)
-                l.append("dbo." + s)
-                l.append("mydb." + s)
-            else:
-                s_square = '[' + s + ']'
-                l.append(s_square)
-                l.append("[dbo]." + s_square)
-                l.append("#[dbo]." + s_square)
-                l.append("public." + s)
-                l.append("#public." + s)
-                l.append("#" + s)
-                l.append("@" + s)
-                l.append("dbo." + s)
-                l.append("mydb." + s)
-
-            return l
-
-        def __get_map(option):
-            d = dict()
-            m = self.name2tab
-            if option == "name2tab":
-                m = self.name2tab
-            elif option == "user_name2tab":
-                # m = self.user_name2tab
-                pass
-            for name, tab_obj in m.items():
+    def _get_last_token2name_tab(self):
+        """Map the lowered table names, and the lowered last tokens of the dotted ones, to (table name, Table).
+        `name2tab` only ever grows, so the map is kept across lookups and only extended with the new tables.
+        """
+        m = self.name2tab
+        d = self._last_token2name_tab
+        if len(m) < self._last_token2name_tab_size:
+            d.clear()
+            self._last_token2name_tab_size = 0
+        if len(m) != self._last_token2name_tab_size:
+            for name, tab_obj in islice(m.items(), self._last_token2name_tab_size, None):
                 if '.' in name:
-                    last_token = name.rsplit('.', 1)[1]
+                    last_token = name.rpartition('.')[2]
                     d[last_token.lower()] = (name, tab_obj)
                 d[name.lower()] = (name, tab_obj)
-            return d
+            self._last_token2name_tab_size = len(m)
+            self._table_definition_cache.clear()
+        return d
+
+    def _get_lower2name2tab(self, with_last_token=False):
+        """Map the lowered table names to (table name, Table), and with `with_last_token` also the lowered
+        last tokens of the dotted ones (which then take precedence over a full name).
+        The maps are shared by all the checks and only rebuilt when `name2tab` has changed size.
+        """
+        m = self.name2tab
+        if len(m) != self._lower2name2tab_size:
+            self._lower2name2tab = {k.lower(): (k, v) for k, v in m.items()}
+            self._lower2name2tab_with_last_token = self._lower2name2tab | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in m.items() if '.' in k}
+            self._lower2name2tab_size = len(m)
+        return self._lower2name2tab_with_last_token if with_last_token else self._lower2name2tab
+
+    def _get_lower2colname(self, table_obj):
+        """Map the lowered column names of a table to the column names.
+        Columns are only ever added to a table, so the map is kept across lookups (keyed by the table's
+        `name2col` dict) and only extended with the new columns.
+        """
+        return self._get_lower2colname_entry(table_obj)[2]
+
+    def _get_lower2colname_entry(self, table_obj):
+        """The cache entry of a table's columns:
+        [name2col, size, lowered column name -> column name, column name -> result of `_check_column_definition`],
+        the memoized results are dropped whenever the table has new columns.
+        """
+        name2col = table_obj.name2col
+        entry = self._lower2colname_cache.get(id(name2col))
+        # the dict is kept in the entry, so its id cannot be reused by another one
+        if entry is None or entry[0] is not name2col or len(name2col) < entry[1]:
+            entry = self._lower2colname_cache[id(name2col)] = [name2col, 0, dict(), dict()]
+        if len(name2col) != entry[1]:
+            lower2colname = entry[2]
+            for k in islice(name2col, entry[1], None):
+                lower2colname[k.lower()] = k
+            entry[1] = len(name2col)
+            entry[3].clear()
+        return entry
+
+    def _check_table_definition(self, table_name, col_name):
+        """Find the defined table a table name refers to, returns (is_exist, defined table name).
+        The results are memoized until a table is added to `name2tab`.
+        """
+        if not self.name2tab:
+            return (False, table_name)
+        # refreshing the map also drops the memoized results when `name2tab` has grown
+        self._get_last_token2name_tab()
+        res = self._table_definition_cache.get(table_name)
+        if res is None:
+            res = self._table_definition_cache[table_name] = self._lookup_table_definition(table_name, col_name)
+        return res
+
+    def _lookup_table_definition(self, table_name, col_name):
 
         def __has_column(tab_obj, col_name):
             lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
             return True if col_name.lower() in lower2name2col else False
 
-        possible_items = __normalize(table_name) if '.' not in table_name else __normalize(table_name) + __normalize(table_name.rsplit('.', 1)[1])
         if self.name2tab:
-            last_token2name_tab = __get_map("name2tab")
+            last_token2name_tab = self._get_last_token2name_tab()
             # last_token2name_tab_user = __get_map("user_name2tab")
             # likely_strs = self._get_likely_strs(table_name, self.name2tab)
             # print(f"table_name: {table_name}'s most likely match result: {likely_strs}")
+            # fast path: the name as it is written, before building any variant of it
+            item = table_name.lower()
+            if item in last_token2name_tab:
+                return (True, last_token2name_tab[item][0])
+            if item in self.name2tab:
+                return (True, item)
+            # the cached spellings are walked in place rather than sliced and concatenated into a new tuple;
+            # the first item is the name itself, checked above
+            possible_items = islice(_normalize_table_name(table_name), 1, None)
+            if '.' in table_name:
+                possible_items = chain(possible_items, _normalize_table_name(table_name.rpartition('.')[2]))
             for item in possible_items:
                 # if item in self.name2tab:
                 item = item.lower()
@@ -563,26 +683,23 @@ class QueryParser:
         return (False, table_name)
 
     def _check_column_definition(self, table_obj, column_name):
+        """Find the defined column a column name refers to, returns (is_exist, defined column name).
+        The results are memoized per table until a column is added to it.
+        """
+        entry = self._get_lower2colname_entry(table_obj)
+        res = entry[3].get(column_name)
+        if res is None:
+            res = entry[3][column_name] = self._lookup_column_definition(entry[2], column_name)
+        return res
 
-        def __normalize(s):
-            l = list()
-            l.append(s)
-            if all(i in s for i in ('[', ']')):
-                s_without_square = s.replace('[', '').replace(']', '')
-                l.append(s_without_square)
-            else:
-                s_with_square = '[' + s + ']'
-                l.append(s_with_square)
-            return l
-
-        possible_items = __normalize(column_name.lower())
-        lower2name2col = {k.lower(): (k, v) for k, v in table_obj.name2col.items()}
-        if lower2name2col:
+    def _lookup_column_definition(self, lower2colname, column_name):
+        possible_items = _normalize_column_name(column_name.lower())
+        if lower2colname:
             # likely_strs = self._get_likely_strs(column_name, table_obj.name2col)
             # print(f"column_name: {column_name}'s most likely match result: {likely_strs}")
             for item in possible_items:
-                if item in lower2name2col:
-                    return (True, lower2name2col[item][0])
+                if item in lower2colname:
+                    return (True, lower2colname[item])
         return (False, column_name)
 
     def _insert_missing_table(self, tname):
@@ -598,10 +715,11 @@ class QueryParser:
         return c_obj
 
     def _get_table_column_obj(self, column_name):
+        column_name_lower = column_name.lower()
         for t_name, t_obj in self.name2tab.items():
-            lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-            if column_name.lower() in lower2name2col:
-                c_obj = lower2name2col[column_name.lower()][1]
+            lower2colname = self._get_lower2colname(t_obj)
+            if column_name_lower in lower2colname:
+                c_obj = t_obj.name2col[lower2colname[column_name_lower]]
                 return t_obj, c_obj
         """
         for t_name, t_obj in self.user_name2tab.items():
@@ -614,13 +732,14 @@ class QueryParser:
         tables = self.node.tables
         if tables is None or not tables:
             return None, None
+        lower2name2tab = self._get_lower2name2tab()
         for t_name in tables:
-            lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()}
-            if t_name.lower() in lower2name2tab:
-                t_obj = lower2name2tab[t_name.lower()][1]
-                lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                if column_name.lower() in lower2name2col:
-                    c_obj = lower2name2col[column_name.lower()][1]
+            name_tab = lower2name2tab.get(t_name.lower())
+            if name_tab is not None:
+                t_obj = name_tab[1]
+                lower2colname = self._get_lower2colname(t_obj)
+                if column_name_lower in lower2colname:
+                    c_obj = t_obj.name2col[lower2colname[column_name_lower]]
                     return t_obj, c_obj
 
         return None, None
@@ -631,12 +750,34 @@ class QueryParser:
         r_tab_instance = TableInstance(r_tab_obj.tab_name, r_tab_obj)
         binaryjoin_obj = BinaryJoin(l_tab_instance, r_tab_instance)
         binaryjoin_obj.join_type = self.node.join_type
-        binaryjoin_obj.conditions.append((l_col_obj, op, r_col_obj))
+        binaryjoin_obj.add_condition(l_col_obj, op, r_col_obj)
         return binaryjoin_obj
 
+    def _remove_duplicate_binary_joins(self, binary_join_list):
+        """Drop the binary joins equal to an earlier one: same tables, join type and conditions.
+        Separate parse paths (or nodes) can link differently written conditions to the same columns.
+        `BinaryJoin` keeps identity equality, the joins are compared on a key instead, in a single pass.
+
+        Params
+        ------
+        - binary_join_list: list[BinaryJoin]
+
+        Returns
+        -------
+        - list[BinaryJoin], the first of each group of equal joins, in their original order
+        """
+        key2binary_join = dict()
+        for binary_join in binary_join_list:
+            key = (
+                binary_join.table_a.table_obj, binary_join.table_b.table_obj,
+                binary_join.join_type, frozenset(binary_join.conditions),
+            )
+            key2binary_join.setdefault(key, binary_join)
+        return list(key2binary_join.values())
+
     def _construct_query_object(self):
         """Construct a query object according BinaryJoin object list."""
-        binary_join_list = None if not self.binary_join_list else self.binary_join_list
+        binary_join_list = None if not self.binary_join_list else self._remove_duplicate_binary_joins(self.binary_join_list)
         projection_dict = None if not self.projection_dict else self.projection_dict
         aggregate_dict = None if not self.aggregate_dict else self.aggregate_dict
         selection_dict = None if not self.selection_dict else self.selection_dict
@@ -646,191 +787,129 @@ class QueryParser:
         query_obj = Query(binary_join_list, projection_dict, aggregate_dict, selection_dict, groupby_dict)
         return query_obj
 
+    @property
+    def check_failed_cases(self):
+        """[(failed_condition, reason, statement, dictionary)], one record per failed condition and reason."""
+        return list(self._check_failed_cases.values())
+
+    def _record_failed_case(self, failed_case, reason, dictionary):
+        key = (tuple(failed_case), reason)
+        if key not in self._check_failed_cases:
+            self._check_failed_cases[key] = (failed_case, reason, self.node.statement, dictionary)
+
+    def _resolve_side(self, tab, col, side, failed_case):
+        """Resolve the `tab.col` of one side ("left" or "right") of a join condition to the defined table and column.
+        Failed lookups are recorded in `check_failed_cases` (and `unfound_tables`).
+
+        Returns
+        -------
+        - (table name, column name, Table, Column), or None if the table or the column is not defined
+        """
+        is_exist, tab = self._check_table_definition(tab, col)
+        # tab_obj = self.name2tab[tab] if is_exist else self._insert_missing_table(tab)
+        # is_exist = True
+        if not is_exist:
+            self.unfound_tables[tab] = None  # record unfound tables
+            # the message is only formatted when debug logging is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("table check fail: %s in %s", tab, failed_case)
+            self._record_failed_case(failed_case, f"failed on check table({side})", self.name2tab)
+            return None
+        try:
+            tab_obj = self.name2tab[tab]
+        except:
+            # tab_obj = self.user_name2tab[tab]
+            return None
+        is_exist, col = self._check_column_definition(tab_obj, col)
+        if not is_exist:
+            # col_obj = self._insert_missing_column(col, tab_obj)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("column check fail: %s in %s", col, failed_case)
+            self._record_failed_case(failed_case, f"failed on check column({side})", tab_obj.name2col)
+            return None
+        return tab, col, tab_obj, tab_obj.name2col[col]
+
+    def _resolve_side_expr(self, expr, side, failed_case):
+        """Resolve one side of a join condition that is either `tab.col` or a bare column name,
+        see `_resolve_side` for the returned value. A resolved table is removed from the node's tables.
+        """
+        tab, sep, col = expr.rpartition('.')
+        if sep:
+            resolved = self._resolve_side(tab, col, side, failed_case)
+            if resolved is not None:
+                tables = self.node.tables if self.node else None
+                if tables and resolved[2].tab_name in tables:
+                    tables.remove(resolved[2].tab_name)
+            return resolved
+        tab_obj, col_obj = self._get_table_column_obj(expr)
+        if tab_obj is None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("table check fail: NotKnownTable in %s", failed_case)
+            self._record_failed_case(failed_case, f"failed on check table({side})", self.name2tab)
+            return None
+        if col_obj is None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("column check fail: %s in %s", expr, failed_case)
+            self._record_failed_case(failed_case, f"failed on check column({side})", tab_obj.name2col)
+            return None
+        return tab_obj.tab_name, expr, tab_obj, col_obj
+
     def _get_binaryjoin_list(self, condition_list):
 
         def __get_entity(condition):
             left, op, right = condition
-            l_tab, l_col = left.rsplit('.', 1)
-            r_tab, r_col = right.rsplit('.', 1)
+            l_tab, l_sep, l_col = left.rpartition('.')
+            r_tab, r_sep, r_col = right.rpartition('.')
+            if not (l_sep and r_sep):
+                raise ValueError("condition side without a table prefix")
             return l_tab, l_col, r_tab, r_col, op
 
+        def __add_condition(l_tab, l_tab_obj, l_col_obj, r_tab, r_tab_obj, r_col_obj, op):
+            # conditions on the same pair of tables go to the same BinaryJoin object
+            if (binaryjoin_obj := name_pair2obj_pair.get((l_tab, r_tab))) is not None:
+                binaryjoin_obj.add_condition(l_col_obj, op, r_col_obj)
+            elif (binaryjoin_obj := name_pair2obj_pair.get((r_tab, l_tab))) is not None:
+                binaryjoin_obj.add_condition(r_col_obj, op, l_col_obj)
+            else:
+                binaryjoin_obj = self._construct_binaryjoin_object(l_tab_obj, l_col_obj, r_tab_obj, r_col_obj, op)
+                binaryjoin_list.append(binaryjoin_obj)
+                name_pair2obj_pair[(l_tab, r_tab)] = binaryjoin_obj
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("table and column check succ: %s.%s %s %s.%s", l_tab, l_col_obj.col_name, op, r_tab, r_col_obj.col_name)
+
         binaryjoin_list = list()
         name_pair2obj_pair = dict()
 
-        if self.only_two_join_tables:
-            for condition in condition_list:
+        # both modes share the resolution of the two sides, they only differ in how a condition is split:
+        # whole expressions (`tab.col` or a bare column) or `tab.col` on both sides
+        only_two_join_tables = self.only_two_join_tables
+        for condition in condition_list:
+            if only_two_join_tables:
                 left, op, right = condition
                 if left.isdigit() or right.isdigit():
                     continue
-                # print(f"input condition: {left} {op} {right}")
-                if '.' in left:
-                    l_tab, l_col = left.rsplit('.', 1)
-
-                    is_exist, l_tab = self._check_table_definition(l_tab, l_col)
-                    # l_tab_obj = self.name2tab[l_tab] if is_exist else self._insert_missing_table(l_tab)
-                    # is_exist = True
-                    if is_exist:
-                        try:
-                            l_tab_obj = self.name2tab[l_tab]
-                        except:
-                            # l_tab_obj = self.user_name2tab[l_tab]
-                            continue
-                        is_exist, l_col = self._check_column_definition(l_tab_obj, l_col)
-                        if is_exist:
-                            l_col_obj = l_tab_obj.name2col[l_col]
-                        else:
-                            # l_col_obj = self._insert_missing_column(l_col, l_tab_obj)
-                            # print(f"column check fail: {l_col} in {left} {op} {right}")
-                            self.check_failed_cases.append(((left, op, right), "failed on check column(left)", self.node.statement, l_tab_obj.name2col))
-                            continue
-                        try:
-                            self.node.tables = self.node.tables.remove(l_tab_obj.tab_name) \
-                                if self.node and self.node.tables and l_tab_obj.tab_name in self.node.tables else self.node.tables
-                        except:
-                            pass
-                    else:
-                        self.unfound_tables.append(l_tab)  # record unfound tables
-                        # print(f"table check fail: {l_tab} in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check table(left)", self.node.statement, self.name2tab))
-                        continue
-                else:
-                    if left.isdigit():
-                        continue
-                    l_tab_obj, l_col_obj = self._get_table_column_obj(left)
-                    if l_tab_obj is None:
-                        # print(f"table check fail: NotKnownTable in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check table(left)", self.node.statement, self.name2tab))
-                        continue
-                    if l_col_obj is None:
-                        # print(f"column check fail: {left} in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check column(left)", self.node.statement, l_tab_obj.name2col))
-                        continue
-                    else:
-                        l_tab = l_tab_obj.tab_name
-                        l_col = left
-                if '.' in right:
-                    r_tab, r_col = right.rsplit('.', 1)
-
-                    is_exist, r_tab = self._check_table_definition(r_tab, r_col)
-                    # r_tab_obj = self.name2tab[r_tab] if is_exist else self._insert_missing_table(r_tab)
-                    # is_exist = True
-                    if is_exist:
-                        try:
-                            r_tab_obj = self.name2tab[r_tab]
-                        except:
-                            # r_tab_obj = self.user_name2tab[r_tab]
-                            continue
-                        is_exist, r_col = self._check_column_definition(r_tab_obj, r_col)
-                        if is_exist:
-                            r_col_obj = r_tab_obj.name2col[r_col]
-                        else:
-                            # r_col_obj = self._insert_missing_column(r_col, r_tab_obj)
-                            # print(f"column check fail: {r_col} in {left} {op} {right}")
-                            self.check_failed_cases.append(((left, op, right), "failed on check column(right)", self.node.statement, r_tab_obj.name2col))
-                            continue
-                        self.node.tables = self.node.tables.remove(r_tab_obj.tab_name) \
-                            if self.node and self.node.tables and r_tab_obj.tab_name in self.node.tables else self.node.tables
-                    else:
-                        self.unfound_tables.append(r_tab)  # record unfound tables
-                        # print(f"table check fail: {r_tab} in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check table(right)", self.node.statement, self.name2tab))
-                        continue
-                else:
-                    if right.isdigit():
-                        continue
-                    r_tab_obj, r_col_obj = self._get_table_column_obj(right)
-                    if r_tab_obj is None:
-                        # print(f"table check fail: NotKnownTable in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check table(right)", self.node.statement, self.name2tab))
-                        continue
-                    if r_col_obj is None:
-                        # print(f"column check fail: {right} in {left} {op} {right}")
-                        self.check_failed_cases.append(((left, op, right), "failed on check column(right)", self.node.statement, r_tab_obj.name2col))
-                        continue
-                    else:
-                        r_tab = r_tab_obj.tab_name
-                        r_col = right
-
-                if (l_tab, r_tab) in name_pair2obj_pair:
-                    binaryjoin_obj = name_pair2obj_pair[(l_tab, r_tab)]
-                    binaryjoin_obj.conditions.append((l_col_obj, op, r_col_obj))
-                elif (r_tab, l_tab) in name_pair2obj_pair:
-                    binaryjoin_obj = name_pair2obj_pair[(r_tab, l_tab)]
-                    binaryjoin_obj.conditions.append((r_col_obj, op, l_col_obj))
-                else:
-                    binaryjoin_obj = self._construct_binaryjoin_object(l_tab_obj, l_col_obj, r_tab_obj, r_col_obj, op)
-                    binaryjoin_list.append(binaryjoin_obj)
-                    name_pair2obj_pair[(l_tab, r_tab)] = binaryjoin_obj
-                # print(f"table and column check succ: {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-        # """
-        else:
-            for condition in condition_list:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("input condition: %s %s %s", left, op, right)
+                resolve, l_args, r_args, failed_case = self._resolve_side_expr, (left,), (right,), (left, op, right)
+            else:
                 try:
                     l_tab, l_col, r_tab, r_col, op = __get_entity(condition)
                 except:
                     continue
                 if l_tab.isdigit() or l_col.isdigit() or r_tab.isdigit() or r_col.isdigit():
                     continue
-                # print(f"input condition: {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-
-                is_exist, l_tab = self._check_table_definition(l_tab, l_col)
-                # l_tab_obj = self.name2tab[l_tab] if is_exist else self._insert_missing_table(l_tab)
-                # is_exist = True
-                if is_exist:
-                    try:
-                        l_tab_obj = self.name2tab[l_tab]
-                    except:
-                        # l_tab_obj = self.user_name2tab[l_tab]
-                        continue
-                    is_exist, l_col = self._check_column_definition(l_tab_obj, l_col)
-                    if is_exist:
-                        l_col_obj = l_tab_obj.name2col[l_col]
-                    else:
-                        # l_col_obj = self._insert_missing_column(l_col, l_tab_obj)
-                        # print(f"column check fail: {l_col} in {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-                        self.check_failed_cases.append((condition, "failed on check column(left)", self.node.statement, l_tab_obj.name2col))
-                        continue
-                else:
-                    self.unfound_tables.append(l_tab)  # record unfound tables
-                    # print(f"table check fail: {l_tab} in {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-                    self.check_failed_cases.append((condition, "failed on check table(left)", self.node.statement, self.name2tab))
-                    continue
-
-                is_exist, r_tab = self._check_table_definition(r_tab, r_col)
-                # r_tab_obj = self.name2tab[r_tab] if is_exist else self._insert_missing_table(r_tab)
-                # is_exist = True
-                if is_exist:
-                    try:
-                        r_tab_obj = self.name2tab[r_tab]
-                    except:
-                        # r_tab_obj = self.user_name2tab[r_tab]
-                        continue
-                    is_exist, r_col = self._check_column_definition(r_tab_obj, r_col)
-                    if is_exist:
-                        r_col_obj = r_tab_obj.name2col[r_col]
-                    else:
-                        # r_col_obj = self._insert_missing_column(r_col, r_tab_obj)
-                        # print(f"column check fail: {r_col} in {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-                        self.check_failed_cases.append((condition, "failed on check column(right)", self.node.statement, r_tab_obj.name2col))
-                        continue
-                else:
-                    self.unfound_tables.append(r_tab)  # record unfound tables
-                    # print(f"table check fail: {r_tab} in {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-                    self.check_failed_cases.append((condition, "failed on check table(right)", self.node.statement, self.name2tab))
-                    continue
-
-                if (l_tab, r_tab) in name_pair2obj_pair:
-                    binaryjoin_obj = name_pair2obj_pair[(l_tab, r_tab)]
-                    binaryjoin_obj.conditions.append((l_col_obj, op, r_col_obj))
-                elif (r_tab, l_tab) in name_pair2obj_pair:
-                    binaryjoin_obj = name_pair2obj_pair[(r_tab, l_tab)]
-                    binaryjoin_obj.conditions.append((r_col_obj, op, l_col_obj))
-                else:
-                    binaryjoin_obj = self._construct_binaryjoin_object(l_tab_obj, l_col_obj, r_tab_obj, r_col_obj, op)
-                    binaryjoin_list.append(binaryjoin_obj)
-                    name_pair2obj_pair[(l_tab, r_tab)] = binaryjoin_obj
-                # print(f"table and column check succ: {l_tab}.{l_col} {op} {r_tab}.{r_col}")
-        # """
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("input condition: %s.%s %s %s.%s", l_tab, l_col, op, r_tab, r_col)
+                resolve, l_args, r_args, failed_case = self._resolve_side, (l_tab, l_col), (r_tab, r_col), condition
+            l_resolved = resolve(*l_args, "left", failed_case)
+            if l_resolved is None:
+                continue
+            r_resolved = resolve(*r_args, "right", failed_case)
+            if r_resolved is None:
+                continue
+            l_tab, _, l_tab_obj, l_col_obj = l_resolved
+            r_tab, _, r_tab_obj, r_col_obj = r_resolved
+            __add_condition(l_tab, l_tab_obj, l_col_obj, r_tab, r_tab_obj, r_col_obj, op)
 
         return binaryjoin_list
 
@@ -841,37 +920,48 @@ class QueryParser:
             if metadata.columns_dict.get("where") is not None else list()
         return limit_cols_join + limit_cols_where
 
+    def _get_alias2query(self, node):
+        """Map the aliases of a node's sub-queries, as written and lowered, to the sub-query statements.
+        A later sub-query dict (and the lowered alias within one) wins, as when the dicts were merged;
+        the ChainMap is only probed, so the dicts are no longer copied into a merged one.
+        """
+        maps = list()
+        for d in reversed(node.sub_query_list):
+            if d is not None:
+                maps.append({k.lower(): v for k, v in d.items()})
+                maps.append(d)
+        return ChainMap(*maps)
+
     def _find_table_in_children(self, alias, column):
 
         def __is_in_columns(column):
             for c in metadata.columns:
-                if '.' in c:
-                    tab_name, col_name = c.rsplit(".", 1)
+                tab_name, sep, col_name = c.rpartition('.')
+                if sep:
                     if column == col_name:
                         return (True, tab_name)
             return (False, alias)
 
-        alias2query = dict()
-        for d in self.node.sub_query_list:
-            if d is not None:
-                alias2query |= d
-                alias2query |= {k.lower(): v for k, v in d.items()}
-        sub_query = alias2query[alias]
-        metadata = Parser(sub_query)
-        lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()}
+        sub_query = self._get_alias2query(self.node)[alias]
+        metadata = _get_metadata_parser(sub_query)
+        lower2name2tab = self._get_lower2name2tab()
         if metadata.columns_aliases and column in metadata.columns_aliases:
             column = metadata.columns_aliases[column]
         if metadata.tables:
+            # the names are lowered once, not again for every map probed
+            column_lower = column.lower() if isinstance(column, str) else None
             for table_name in metadata.tables:
-                if table_name.lower() in lower2name2tab:
-                    t_obj = lower2name2tab[table_name.lower()][1]
-                    lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                    if isinstance(column, str) and column.lower() in lower2name2col:
-                        return t_obj.tab_name, lower2name2col[column.lower()][0]
+                name_tab = lower2name2tab.get(table_name.lower())
+                if name_tab is not None:
+                    t_obj = name_tab[1]
+                    lower2colname = self._get_lower2colname(t_obj)
+                    if column_lower is not None and column_lower in lower2colname:
+                        return t_obj.tab_name, lower2colname[column_lower]
                     else:
                         for c in column:
-                            if c.lower() in lower2name2col:
-                                return t_obj.tab_name, lower2name2col[c.lower()][0]
+                            c_lower = c.lower()
+                            if c_lower in lower2colname:
+                                return t_obj.tab_name, lower2colname[c_lower]
         if len(metadata.tables) == 1:
             return (metadata.tables[0], column)
         if metadata.columns:
@@ -884,142 +974,67 @@ class QueryParser:
             return (col2tab[column], column) if column in col2tab else (alias, column)
         return alias, column
 
-    def _find_table_in_parent(self, alias_or_name, parent):
-        a2t = parent.alias2table
-        return (a2t[alias_or_name], True) if alias_or_name in a2t else (alias_or_name, False)
-
     def _get_left_right(self, condition, op):
 
         def __has_matched_subquery(alias):
-            alias_list = list()
-            for d in self.node.sub_query_list:
-                if d is not None:
-                    alias_list += d.keys()
-                    alias_list += [s.lower() for s in d.keys()]
-            return True if alias in alias_list else False
+            return alias in self._get_alias2query(self.node)
 
         def __rm_double_colon(s):
             return s.rsplit("::", 1)[0].strip() if "::" in s else s
 
+        def __qualify_side(side):
+            # qualify one side of the condition with its table name, None if the bare column is not found
+            side_table, sep, side_column = side.rpartition('.')
+            if sep:
+                # find table's alias in current scope
+                # find table's alias in children scope
+                if __has_matched_subquery(side_table):
+                    side_table, side_column = self._find_table_in_children(side_table, side_column)
+                # find table's alias in parent scope
+                elif self.node.parent:
+                    side_table = self.node.parent.scope.get(side_table, side_table)
+                    col_name = side_table.strip() + '.' + side_column.strip()
+                    limit_cols.append(col_name)
+                elif side_table in alias2table:
+                    side_table = alias2table[side_table]
+                if not isinstance(side_table, str):
+                    side_table = side_table[0]
+                if not isinstance(side_column, str):
+                    side_column = side_column[0]
+                side = side_table.strip() + '.' + side_column.strip()
+                if side not in self.node.limit_cols:
+                    self.node.limit_cols.append(side)
+            else:
+                # elif self.only_two_join_tables and self.node.tables:
+                side_old = side
+                side_lower = side.lower()
+                for t_name, t_obj in self.name2tab.items():
+                    if side_lower in self._get_lower2colname(t_obj):
+                        side = t_obj.tab_name + '.' + side.strip()
+                        break
+                # iterate in user_name2tab
+                """
+                if side == side_old:
+                    for t_name, t_obj in self.user_name2tab.items():
+                        lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
+                        if side.lower() in lower2name2col:
+                            side = t_obj.tab_name + '.' + side.strip()
+                            break
+                """
+                side = side if side != side_old else None
+                if side is not None and side not in self.node.limit_cols:
+                    self.node.limit_cols.append(side)
+            return side
+
         limit_cols = self.node.limit_cols
         alias2table = self.node.alias2table
-        left = fmt_str(__rm_double_colon(condition.split(op, 1)[0].strip()).lower())
-        right = fmt_str(__rm_double_colon(condition.split(op, 1)[1].strip()).lower())
-
-        if '.' in left:
-            # find table's alias in current scope
-            left_table, left_column = left.rsplit('.', 1)
-            # find table's alias in children scope
-            if __has_matched_subquery(left_table):
-                left_table, left_column = self._find_table_in_children(left_table, left_column)
-            # find table's alias in parent scope
-            elif self.node.parent:
-                parent = self.node.parent
-                while parent is not None:
-                    left_table, found = self._find_table_in_parent(left_table, parent)
-                    if found:
-                        break
-                    parent = parent.parent
-                col_name = left_table.strip() + '.' + left_column.strip()
-                limit_cols.append(col_name)
-            elif left_table in alias2table:
-                left_table = alias2table[left_table]
-            if not isinstance(left_table, str):
-                left_table = left_table[0]
-            if not isinstance(left_column, str):
-                left_column = left_column[0]
-            left = left_table.strip() + '.' + left_column.strip()
-            if left not in self.node.limit_cols:
-                self.node.limit_cols.append(left)
-        else:
-            # elif self.only_two_join_tables and self.node.tables:
-            left_old = left
-            for t_name, t_obj in self.name2tab.items():
-                lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                if left.lower() in lower2name2col:
-                    left = t_obj.tab_name + '.' + left.strip()
-                    break
-            # iterate in user_name2tab
-            """
-            if left == left_old:
-                for t_name, t_obj in self.user_name2tab.items():
-                    lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                    if left.lower() in lower2name2col:
-                        left = t_obj.tab_name + '.' + left.strip()
-                        break
-            """
-            left = left if left != left_old else None
-            """
-            lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
-            for tname in self.node.tables:
-                if tname.lower() in lower2name2tab:
-                    table_obj = lower2name2tab[tname.lower()][1]
-                    lower2name2col = {k.lower(): (k, v) for k, v in table_obj.name2col.items()}
-                    if left.lower() in lower2name2col:
-                        left = table_obj.tab_name + '.' + left.strip()
-                        break
-            """
-            if left is not None and left not in self.node.limit_cols:
-                self.node.limit_cols.append(left)
-
-        if '.' in right:
-            right_table, right_column = right.rsplit('.', 1)
-            # find table's alias in current scope
-            # find table's alias in children scope
-            if __has_matched_subquery(right_table):
-                right_table, right_column = self._find_table_in_children(right_table, right_column)
-            # find table's alias in parent scope
-            elif self.node.parent:
-                parent = self.node.parent
-                while parent is not None:
-                    right_table, found = self._find_table_in_parent(right_table, parent)
-                    if found:
-                        break
-                    parent = parent.parent
-                col_name = right_table.strip() + '.' + right_column.strip()
-                limit_cols.append(col_name)
-            elif right_table in alias2table:
-                right_table = alias2table[right_table]
-            if not isinstance(right_table, str):
-                right_table = right_table[0]
-            if not isinstance(right_column, str):
-                right_column = right_column[0]
-            right = right_table.strip() + '.' + right_column.strip()
-            if right not in self.node.limit_cols:
-                self.node.limit_cols.append(right)
-        else:
-            right_old = right
-            for t_name, t_obj in self.name2tab.items():
-                lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                if right.lower() in lower2name2col:
-                    right = t_obj.tab_name + '.' + right.strip()
-                    break
-            # iterate in user_name2tab
-            """
-            if right == right_old:
-                for t_name, t_obj in self.user_name2tab.items():
-                    lower2name2col = {k.lower(): (k, v) for k, v in t_obj.name2col.items()}
-                    if right.lower() in lower2name2col:
-                        right = t_obj.tab_name + '.' + right.strip()
-                        break
-            """
-            right = right if right != right_old else None
-            """
-            lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
-            for tname in self.node.tables:
-                if tname.lower() in lower2name2tab:
-                    table_obj = lower2name2tab[tname.lower()][1]
-                    lower2name2col = {k.lower(): (k, v) for k, v in table_obj.name2col.items()}
-                    if right.lower() in lower2name2col:
-                        right = table_obj.tab_name + '.' + right.strip()
-                        break
-            if right not in self.node.limit_cols:
-                self.node.limit_cols.append(right)
-            else:
-                right = None
-            """
-            if right is not None and right not in self.node.limit_cols:
-                self.node.limit_cols.append(right)
+        # one pass over the condition for both sides
+        left, _, right = condition.partition(op)
+        left = fmt_str(__rm_double_colon(left.strip()).lower())
+        right = fmt_str(__rm_double_colon(right.strip()).lower())
+
+        left = __qualify_side(left)
+        right = __qualify_side(right)
         return left, right
 
     def _get_mutual_map(self, alias2table):
@@ -1035,7 +1050,7 @@ class QueryParser:
         for item in items:
             if " as " in item.lower():
                 # name, alias = item.split(" as ")
-                name, alias = re.split(" as | AS | As | aS ", item)
+                name, alias = AS_SPLIT_REGEX.split(item)
                 a2t[alias.strip()] = name.strip()
             elif " " in item:
                 name, alias = item.rsplit(" ", 1)
@@ -1048,10 +1063,16 @@ class QueryParser:
     def _normalize_condition(self, condition_list, metadata):
 
         def __get_lower_alias2table(m):
-            return m | {k.lower(): v for k, v in m.items()} | {k.rsplit('.', 1)[-1]: v for k, v in m.items() if '.' in k} | {k.rsplit('.', 1)[-1].lower(): v for k, v in m.items() if '.' in k}
+            # merged in the same order as `m | lowered | last tokens | lowered last tokens`,
+            # with the dotted names split only once
+            last_token2table = [(k.rpartition('.')[2], v) for k, v in m.items() if '.' in k]
+            d = m | {k.lower(): v for k, v in m.items()}
+            d.update(last_token2table)
+            d.update((k.lower(), v) for k, v in last_token2table)
+            return d
 
         def __rm_substr_after_last_space(s):
-            return s.rsplit(' ', 1)[0].strip() if '[' not in s and ']' not in s and ' ' in s else s
+            return s.rpartition(' ')[0].strip() if '[' not in s and ']' not in s and ' ' in s else s
 
         alias2table = dict()
         normal_conditions = list()
@@ -1096,6 +1117,9 @@ class QueryParser:
         except:
             self.node.limit_cols = list()
 
+        # the live list: `_get_left_right` appends every side it qualifies to it while the loop runs
+        limit_cols = self.node.limit_cols
+        get_left_right = self._get_left_right
         for condition in condition_list:
             if "@" in condition:
                 continue
@@ -1103,29 +1127,29 @@ class QueryParser:
                 continue
             elif "<=" in condition:
                 op = "LtEq"
-                left, right = self._get_left_right(condition, "<=")
+                left, right = get_left_right(condition, "<=")
             elif ">=" in condition:
                 op = "GtEq"
-                left, right = self._get_left_right(condition, ">=")
+                left, right = get_left_right(condition, ">=")
             elif "<>" in condition:
                 continue
             elif "<" in condition:
                 op = "Lt"
-                left, right = self._get_left_right(condition, "<")
+                left, right = get_left_right(condition, "<")
             elif ">" in condition:
                 op = "Gt"
-                left, right = self._get_left_right(condition, ">")
+                left, right = get_left_right(condition, ">")
             elif "=" in condition:
                 op = "Eq"
                 condition = condition.replace("==", "=")
-                left, right = self._get_left_right(condition, "=")
+                left, right = get_left_right(condition, "=")
             else:
                 continue
 
             if left is None or right is None:
                 continue
-            if self.node.limit_cols:
-                if left not in self.node.limit_cols or right not in self.node.limit_cols:
+            if limit_cols:
+                if left not in limit_cols or right not in limit_cols:
                     continue
 
             left, right = __rm_substr_after_last_space(left), __rm_substr_after_last_space(right)
@@ -1135,18 +1159,13 @@ class QueryParser:
         return normal_conditions
 
     def _get_tokens(self, token=None, stmt=None):
-        tokens_size = 1
-        with Timeout(3):
-            while tokens_size == 1:
-                try:
-                    tokens = parse(stmt)[0].tokens if stmt else token.tokens
-                except Exception as e:
-                    raise e
-                else:
-                    if len(tokens) == 1:
-                        tokens = self._get_tokens(token=tokens[0])
-                    tokens_size = len(tokens)
-            return tokens
+        # descend through the groups that wrap a single token; a single ungrouped token has no `tokens`
+        # and raises, the callers then fall back to the statement's own tokens.
+        # No `Timeout` here: the tree is fixed once parsed, and leaving it would cancel the caller's alarm
+        tokens = _get_parsed_statement(stmt).tokens if stmt else token.tokens
+        while len(tokens) == 1:
+            tokens = tokens[0].tokens
+        return tokens
 
     def _exclude_clause(self, s):
         s_lower = s.lower()
@@ -1183,55 +1202,43 @@ class QueryParser:
 
         def __include_literal(t):
             for t in t.tokens:
-                if str(t.ttype) == "Token.Literal.String.Single" or isinstance(t, Function):
+                if t.ttype is T.Literal.String.Single or isinstance(t, Function):
                     return True
             return False
 
-        def __extract_continuous_cmp_tokens(token):
-            if not token.is_group:
-                return
-            token_list = token.tokens
-            pos = 2
-            while pos < len(token_list):
-                if(isinstance(token_list[pos], Comparison)
-                        and self._exclude_clause(token_list[pos].value)
-                        and not __include_literal(token_list[pos])):
-                    condition_list.append(token_list[pos].value)
-                elif isinstance(token_list[pos], Function):
-                    __extract_internal_cmp_tokens(token)
-                elif isinstance(token_list[pos], Parenthesis):
-                    __extract_internal_cmp_tokens(token)
-                pos += 1
-
-        def __extract_internal_cmp_tokens(token):
-            if not token.is_group:
-                return
-            intern_tokens = token.tokens
-            for token in intern_tokens:
-                if(isinstance(token, Comparison)
-                        and self._exclude_clause(token.value)
-                        and not __include_literal(token)):
-                    condition_list.append(token.value)
-                elif isinstance(token, Where):
-                    __extract_continuous_cmp_tokens(token)
-                elif isinstance(token, Parenthesis):
-                    __extract_internal_cmp_tokens(token)
-                elif isinstance(token, Function):
-                    __extract_internal_cmp_tokens(token)
-
         condition_list = list()
-        for token in tokens:
-            if(isinstance(token, Comparison)
-                    and self._exclude_clause(token.value)
-                    and not __include_literal(token)):
-                condition_list.append(token.value)
-            elif isinstance(token, Where):
-                __extract_continuous_cmp_tokens(token)
-            elif isinstance(token, Function):
-                condition_list += self._extract_conditions(token.tokens)
-            elif isinstance(token, Parenthesis):
-                # handle join condition in ()
-                __extract_internal_cmp_tokens(token)
+        exclude_clause = self._exclude_clause
+        # module globals bound to locals for the per-token loop
+        get_kind, cmp_kind, where_kind = CONDITION_TOKEN_KINDS.get, CMP_TOKEN, WHERE_TOKEN
+        # depth-first walk with an explicit stack of (token iterator, WHERE clause being scanned or None);
+        # the tokens of a WHERE clause start after its keyword and the following whitespace, and a function
+        # or a parenthesis among them makes the whole clause be scanned again as a plain group
+        stack = [(iter(tokens), None)]
+        while stack:
+            token_iter, where = stack[-1]
+            for token in token_iter:
+                kind = get_kind(type(token))
+                if kind is None:
+                    continue
+                if kind == cmp_kind:
+                    if exclude_clause(token.value) and not __include_literal(token):
+                        condition_list.append(token.value)
+                    continue
+                if where is not None:
+                    if kind == where_kind:
+                        continue
+                    token = where
+                elif kind == where_kind:
+                    if token.is_group:
+                        stack.append((islice(token.tokens, 2, None), token))
+                        break
+                    continue
+                # handle join condition in () and in function arguments
+                if token.is_group:
+                    stack.append((iter(token.tokens), None))
+                    break
+            else:
+                stack.pop()
 
         return condition_list
 
@@ -1278,18 +1285,35 @@ class QueryParser:
             filter_conditions.append(condition)
         return filter_conditions
 
+    def _add_new_conditions(self, conditions):
+        """Append the conditions not seen before in this statement to `condition_list`.
+        The join, where and outter join parses of a statement often extract the same conditions.
+
+        Params
+        ------
+        - conditions: list[tuple[str, str, str]], normalized conditions
+
+        Returns
+        -------
+        - list[tuple[str, str, str]], the new conditions, in their first-seen order
+        """
+        seen = self._condition_seen
+        new_conditions = [c for c in conditions if not (c in seen or seen.add(c))]
+        self.condition_list += new_conditions
+        return new_conditions
+
     def _parse_select_join_query(self, stmt):
         try:
             tokens = self._get_tokens(stmt=stmt)
         except Exception as e:
-            tokens = parse(stmt)[0].tokens
+            tokens = _get_parsed_statement(stmt).tokens
             # raise e
         try:
-            metadata = Parser(stmt)
+            metadata = _get_metadata_parser(stmt)
         except:
             # stmt = stmt[stmt.index("select "):]
             stmt = split_string(stmt, "select ")
-            metadata = Parser(stmt)
+            metadata = _get_metadata_parser(stmt)
         try:
             self.only_two_join_tables = True \
                 if len(metadata.tables) == 2 \
@@ -1297,20 +1321,20 @@ class QueryParser:
         except:
             pass
         else:
+            # copied, the node's tables are modified and the parser is shared
             try:
-                self.node.tables = metadata.tables
+                self.node.tables = list(metadata.tables)
             except Exception as e:
-                self.node.tables = metadata.tables
+                self.node.tables = list(metadata.tables)
             except:
-                print("get tables from metadata error!")
+                logger.warning("get tables from metadata error!")
 
         condition_list = self._extract_conditions(tokens)
         condition_list = self.filter_raw_conditions(condition_list)
         self.raw_condition_list += condition_list
 
         normal_conditions = self._normalize_condition(condition_list, metadata)
-        normal_conditions = list(set(normal_conditions))
-        self.condition_list += normal_conditions
+        normal_conditions = self._add_new_conditions(normal_conditions)
 
         if not self.is_debug:
             binary_join_list = self._get_binaryjoin_list(normal_conditions)
@@ -1320,13 +1344,10 @@ class QueryParser:
 
         def __include_literal(t):
             for t in t.tokens:
-                if str(t.ttype) == "Token.Literal.String.Single" or isinstance(t, Function):
+                if t.ttype is T.Literal.String.Single or isinstance(t, Function):
                     return True
             return False
 
-        def __find_all_where_tokens(tokens):
-            return [t for t in tokens if isinstance(t, Where) if t.value.lower() != "select" and "where" in t.value.lower()]
-
         def __find_all_cmp_tokens(tokens):
             l = list()
             for token in tokens:
@@ -1335,57 +1356,59 @@ class QueryParser:
                     l.append(fmt_str(token.value))
             return l
 
-        def __get_condition_str(l):
-            for where_token in l:
-                # yield where_token.value.split("where")[1].strip()
-                yield split_string(where_token.value, "where").strip()
-
         try:
-            tokens = parse(stmt)[0].tokens
+            tokens = _get_parsed_statement(stmt).tokens
         except Exception as e:
             raise e
         try:
-            metadata = Parser(stmt)
+            metadata = _get_metadata_parser(stmt)
         except Exception as e:
             raise e
 
-        condition_list = list()
-        where_tokens = __find_all_where_tokens(tokens)
+        # the WHERE clauses and the text after their keyword, found in a single pass
+        where_clauses = list()
+        for token in tokens:
+            if type(token) is Where:
+                where_pos = token.value.lower().find("where")
+                if where_pos != -1:
+                    where_clauses.append((token, token.value[where_pos + 5:].strip()))
 
-        for where_token in where_tokens:
+        condition_list = list()
+        for where_token, _ in where_clauses:
             condition_list += __find_all_cmp_tokens(where_token.tokens)
 
-        for condition_str in __get_condition_str(where_tokens):
-            if " and " in condition_str.lower():
-                condition_list += [c.strip() for c in re.split(" and | AND | And ", condition_str) if self._exclude_clause(c) and c.strip() not in condition_list]
-            elif " or " in condition_str.lower() and self._exclude_clause(condition_str):
-                condition_list += [c.strip() for c in re.split(" or | OR | Or | oR ", condition_str) if self._exclude_clause(c) and c.strip() not in condition_list]
-            elif self._exclude_clause(condition_str) and condition_str.strip() not in condition_list:
-                condition_list.append(condition_str.strip())
+        exclude_clause = self._exclude_clause
+        # the conditions collected so far, a split clause is only checked against those before it
+        seen = set(condition_list)
+        for _, condition_str in where_clauses:
+            # the condition text is already stripped
+            condition_str_lower = condition_str.lower()
+            if " and " in condition_str_lower:
+                parts = AND_SPLIT_REGEX.split(condition_str)
+            elif " or " in condition_str_lower and exclude_clause(condition_str):
+                parts = OR_SPLIT_REGEX.split(condition_str)
+            else:
+                if exclude_clause(condition_str) and condition_str not in seen:
+                    condition_list.append(condition_str)
+                    seen.add(condition_str)
+                continue
+            # each part is stripped once
+            new_conditions = [c for part in parts if exclude_clause(part) and (c := part.strip()) not in seen]
+            condition_list += new_conditions
+            seen.update(new_conditions)
 
         condition_list = self.filter_raw_conditions(condition_list)
         self.raw_condition_list += condition_list
 
         normal_conditions = self._normalize_condition(condition_list, metadata)
-        normal_conditions = list(set(normal_conditions))
-        self.condition_list += normal_conditions
+        normal_conditions = self._add_new_conditions(normal_conditions)
 
         if not self.is_debug:
             binary_join_list = self._get_binaryjoin_list(normal_conditions)
             self.binary_join_list += binary_join_list
 
     def _find_table_in_subquery(self, column_name, subquery):
-        subquery_metadata = Parser(subquery)
-        try:
-            projections = subquery_metadata.columns_dict["select"]
-        except:
-            return
-        for col in projections:
-            if '.' in col:
-                tab_name, col_name = col.rsplit('.', 1)
-                if col_name == column_name:
-                    return tab_name
-        return
+        return _get_subquery_column2table(subquery).get(column_name)
 
     def _parse_outter_join(self, metadata):
 
@@ -1442,18 +1465,12 @@ class QueryParser:
             return left_table + '.' + left_column, op, right_table + '.' + right_column
 
         root = self.visitor.root
-        outter_alias2table = {k: v for k, v in self.visitor.tables.items()}
+        # `_get_mutual_map` builds a new dict and leaves the visitor's tables untouched
+        outter_alias2table = self._get_mutual_map(self.visitor.tables)
         # print(outter_alias2table)
-        outter_alias2table = self._get_mutual_map(outter_alias2table)
         condition_list = list()
         outter_join_list = list()
-        root_sub_list = [t for t in root.get_sublists()]
-
-        for pos, token in enumerate(root_sub_list):
-            if pos + 1 < len(root_sub_list):
-                next_token = root_sub_list[pos + 1]
-            else:
-                continue
+        for token, next_token in pairwise(root.get_sublists()):
             if isinstance(token, Identifier) and "select " in token.value.lower() \
                     and isinstance(next_token, Comparison):
                 outter_join_list.append((token, next_token))
@@ -1466,35 +1483,31 @@ class QueryParser:
 
         self.raw_condition_list += condition_list
 
-        condition_list = list(set(condition_list))
-        self.condition_list += condition_list
+        condition_list = self._add_new_conditions(condition_list)
 
         if not self.is_debug:
             self.binary_join_list += self._get_binaryjoin_list(condition_list)
 
     def _find_internal_query(self, stmt):
-        left_pos, right_pos = 0, len(stmt) - 1
-        left_parenthesis_num, right_parenthesis_num = 0, 0
-        is_end = False
-        while left_pos < len(stmt) and right_pos >= 0:
-            while left_pos < len(stmt):
-                if left_pos + 6 < len(stmt) and stmt[left_pos:left_pos + 6].lower() == "select":
-                    is_end = True
-                    break
-                if stmt[left_pos] == '(':
-                    left_parenthesis_num += 1
-                    break
-                left_pos += 1
-            if is_end:
-                break
-            while right_pos > 0:
-                if stmt[right_pos] == ')':
-                    right_parenthesis_num += 1
-                    break
-                right_pos -= 1
-            left_pos += 1
-
-        return stmt if left_parenthesis_num != right_parenthesis_num else stmt[left_pos:right_pos + 1]
+        """Cut the statement down to its first SELECT and the last closing parenthesis, when the parentheses
+        opened before that SELECT are closed; otherwise the statement is returned as it is.
+        """
+        if not stmt:
+            return stmt
+        # the first SELECT followed by at least one character
+        m = SELECT_REGEX.search(stmt, 0, len(stmt) - 1)
+        left_parenthesis_num = stmt.count('(', 0, m.start() if m else len(stmt))
+        # the last ')' after the first character
+        right_pos = stmt.rfind(')', 1)
+        if m is None:
+            # without a SELECT the scan only balanced (and cut everything) when there was no ')' at all
+            # and no '(', or when the last '(' ended the statement
+            if right_pos == -1:
+                return stmt if left_parenthesis_num else ""
+            return "" if left_parenthesis_num and stmt.endswith('(') else stmt
+        if not left_parenthesis_num:
+            return stmt[m.start():]
+        return stmt if right_pos == -1 else stmt[m.start():right_pos + 1]
 
     def _get_subqueries(self):
 
@@ -1513,20 +1526,25 @@ class QueryParser:
                 d[alias] = child.statement
         return d
 
-    def _parse_single_query_statement(self, stmt):
-        """Parse single select statement."""
+    def _parse_single_query_statement(self, stmt, features=None):
+        """Parse single select statement.
+        `features` are the statement's `_get_statement_features` when already known.
+        """
         self.single_query = True
-        if all(s in stmt.lower() for s in ("select", "join")):
+        if features is None:
+            features = _get_statement_features(stmt)
+        if features & SELECT_JOIN == SELECT_JOIN:
             self._parse_select_join_query(stmt)
             # self._parse_select_where_query(stmt)
-        elif all(s in stmt.lower() for s in ("select", "where")):
+        elif features & SELECT_WHERE == SELECT_WHERE:
             self._parse_select_where_query(stmt)
 
-    def _parse_multiple_query_statement(self, stmt):
+    def _parse_multiple_query_statement(self, stmt, features=None):
         """Parse multiple select statement.
         Include: 1. union query, 2. nested query.
+        `features` are the statement's `_get_statement_features` when already known.
         """
-        metadata = Parser(fmt_str(stmt))
+        metadata = _get_metadata_parser(fmt_str(stmt))
         try:
             if metadata.subqueries:
                 self.node.sub_query_list.append(metadata.subqueries)
@@ -1541,12 +1559,14 @@ class QueryParser:
         # print(self.node.sub_query_list)
 
         # TODO: get outter alias2table from every subqueries.
+        if features is None:
+            features = _get_statement_features(stmt)
         # if all(s in stmt.lower() for s in ("select ", "join ")):
-        if all(s in stmt.lower() for s in ("select", "join")):
+        if features & SELECT_JOIN == SELECT_JOIN:
             self._parse_select_join_query(stmt)
             self._parse_select_where_query(stmt)
         # elif all(s in stmt.lower() for s in ("select ", "where ")):
-        elif all(s in stmt.lower() for s in ("select", "where")):
+        elif features & SELECT_WHERE == SELECT_WHERE:
             self._parse_select_where_query(stmt)
 
         # handle subquery joins
@@ -1556,19 +1576,40 @@ class QueryParser:
 
         def __get_join_type(query_node):
             stmt = query_node.statement.lower()
-            for child in query_node.children:
-                stmt = stmt.replace(child.statement.lower(), "")
+            if query_node.children:
+                # cut every occurrence of the children's statements out in a single pass
+                spans = list()
+                for child in query_node.children:
+                    child_stmt = child.statement.lower()
+                    if not child_stmt:
+                        continue
+                    start = stmt.find(child_stmt)
+                    while start != -1:
+                        end = start + len(child_stmt)
+                        spans.append((start, end))
+                        start = stmt.find(child_stmt, end)
+                spans.sort()
+                parts = list()
+                pos = 0
+                for start, end in spans:
+                    if start > pos:
+                        parts.append(stmt[pos:start])
+                    pos = max(pos, end)
+                parts.append(stmt[pos:])
+                stmt = "".join(parts)
             if "join" not in stmt:
                 return "inner"
             else:
-                join_num = list()
-                join_num.append(("inner", stmt.count("inner join")))
-                join_num.append(("left", stmt.count("left join") + stmt.count("left outer join")))
-                join_num.append(("right", stmt.count("right join") + stmt.count("right outer join")))
-                join_num.append(("full", stmt.count("full join") + stmt.count("full outer join")))
-                join_num.append(("cross", stmt.count("cross join")))
-                join_num.sort(key=lambda x: x[1], reverse=True)
-            return join_num[0][0]
+                # `str.count` scans in C, which is faster on these statements than one regex pass over them;
+                # `max` keeps the first of equal counts, like the stable descending sort it replaces
+                join_num = (
+                    ("inner", stmt.count("inner join")),
+                    ("left", stmt.count("left join") + stmt.count("left outer join")),
+                    ("right", stmt.count("right join") + stmt.count("right outer join")),
+                    ("full", stmt.count("full join") + stmt.count("full outer join")),
+                    ("cross", stmt.count("cross join")),
+                )
+            return max(join_num, key=itemgetter(1))[0]
 
         def __get_subquery_list(query_node):
             subquery_list = list()
@@ -1576,26 +1617,34 @@ class QueryParser:
             for child in children:
                 token = child.token.parent
                 if token.has_alias():
-                    sub_list = [t for t in token.get_sublists()]
-                    subquery = sub_list[0].value[1:-1]
-                    alias = sub_list[1].value
+                    # only the first two sub-lists are needed, the (sub-query) and its alias
+                    subquery_token, alias_token = islice(token.get_sublists(), 2)
+                    subquery = subquery_token.value[1:-1]
+                    alias = alias_token.value
                     subquery_list.append({alias: subquery})
             return subquery_list
 
         query_nodes = list()
-
-        # links all nodes' parent
-        for i in range(len(token_nodes)):
-            node = QueryNode(token_nodes[i])
+        # id(token) -> (index, QueryNode) of the last node built on that token so far
+        token2node = dict()
+        get_entry = token2node.get
+
+        # links all nodes' parent and children: the parent is the last built node whose token is an ancestor,
+        # found by walking the token's ancestors once rather than testing every node built so far
+        for i, token in enumerate(token_nodes):
+            node = QueryNode(token)
             query_nodes.append(node)
-            for j in range(len(query_nodes)):
-                if node.token.has_ancestor(query_nodes[j].token):
-                    node.parent = query_nodes[j]
-
-        # links all nodes' children
-        for query_node in query_nodes:
-            if query_node.parent:
-                query_node.parent.children.append(query_node)
+            parent_index, parent = -1, None
+            ancestor = token.parent
+            while ancestor is not None:
+                entry = get_entry(id(ancestor))
+                if entry is not None and entry[0] > parent_index:
+                    parent_index, parent = entry
+                ancestor = ancestor.parent
+            token2node[id(token)] = (i, node)
+            if parent is not None:
+                node.parent = parent
+                parent.children.append(node)
 
         # generate subquery list
         for query_node in query_nodes:
@@ -1613,7 +1662,7 @@ class QueryParser:
         # get tables for each query node
         for query_node in query_nodes:
             try:
-                node_parser = Parser(query_node.statement)
+                node_parser = _get_metadata_parser(query_node.statement)
                 tables = node_parser.tables if node_parser.tables else query_node.tables
             except:
                 pass
@@ -1635,39 +1684,38 @@ class QueryParser:
             stmt = nodes[0].statement
             self.node = nodes[0]
             try:
-                self._parse_single_query_statement(stmt)
+                self._parse_single_query_statement(stmt, self.node.features)
             except Exception as e:
                 # print("Query parse error:", e)
-                logging.exception(e)
+                logger.exception(e)
             # try to extract SELECT part in stmt
             if not self.is_debug:
                 if not self.binary_join_list:
                     try:
-                        stmt = self._find_internal_query(stmt)
-                        self._parse_single_query_statement(stmt)
+                        internal_stmt = self._find_internal_query(stmt)
+                        # the keywords are only looked up again when the statement was actually cut
+                        features = self.node.features if internal_stmt == stmt else None
+                        stmt = internal_stmt
+                        self._parse_single_query_statement(stmt, features)
                     except Exception as e:
                         # print("Query parse error:", e)
-                        logging.exception(e)
+                        logger.exception(e)
             try:
                 self._extract_projection(self.node)
             except Exception as e:
-                print("proj parse error")
-                logging.exception(e)
+                logger.exception("proj parse error")
             try:
                 self._extract_selection(self.node)
             except Exception as e:
-                print("selection parse error")
-                logging.exception(e)
+                logger.exception("selection parse error")
             try:
                 self._extract_groupby(self.node)
             except Exception as e:
-                print("groupby parse error")
-                logging.exception(e)
+                logger.exception("groupby parse error")
             try:
                 self._extract_aggregate(self.node)
             except Exception as e:
-                print("agg parse error")
-                logging.exception(e)
+                logger.exception("agg parse error")
         # handle multiple-select query
         elif len(nodes) > 1:
             # print(nodes[0].children[0].statement)
@@ -1676,37 +1724,33 @@ class QueryParser:
                 self.node = node
                 # print(stmt)
                 try:
-                    self._parse_multiple_query_statement(stmt)
+                    self._parse_multiple_query_statement(stmt, node.features)
                 except Exception as e:
                     # print("Query parse error:", e)
-                    logging.exception(e)
+                    logger.exception(e)
                 try:
                     self._extract_projection(self.node)
                 except Exception as e:
-                    print("proj parse error")
-                    logging.exception(e)
+                    logger.exception("proj parse error")
                 try:
                     self._extract_selection(self.node)
                 except Exception as e:
-                    print("selection parse error")
-                    logging.exception(e)
+                    logger.exception("selection parse error")
                 try:
                     self._extract_groupby(self.node)
                 except Exception as e:
-                    print("groupby parse error")
-                    logging.exception(e)
+                    logger.exception("groupby parse error")
                 try:
                     self._extract_aggregate(self.node)
                 except Exception as e:
-                    print("agg parse error")
-                    logging.exception(e)
+                    logger.exception("agg parse error")
 
     def _preprocess(self, s):
         return s.replace("(nolock)", "").replace("(NOLOCK)", "").replace("(+)", "").replace("(-)", "")
 
     @lru_cache(1024)
     def is_union_query(self, t, is_exist=False):
-        if "tokens" in dir(t):
+        if isinstance(t, TokenList):
             tokens = t.tokens
             for token in tokens:
                 if self.is_union_query(token):
@@ -1716,10 +1760,10 @@ class QueryParser:
         return False
 
     def _check_projection(self, projection_list, from_tables, is_wildcard=False):
-        lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
+        lower2name2tab = self._get_lower2name2tab(with_last_token=True)
         if is_wildcard:
             for tname in from_tables:
-                tname = tname.lower() if '.' not in tname else tname.rsplit('.', 1)[1].lower()
+                tname = tname.rpartition('.')[2].lower()
                 if tname in lower2name2tab:
                     tab_obj = lower2name2tab[tname][1]
                     if tab_obj not in self.projection_dict:
@@ -1731,12 +1775,12 @@ class QueryParser:
             for proj in projection_list:
                 if '.' in proj:
                     # for table-prefix column
-                    t, c = proj.lower().rsplit('.', 1)
+                    t, _, c = proj.lower().rpartition('.')
                     if t in lower2name2tab:
                         tab_obj = lower2name2tab[t][1]
-                        lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                        if c in lower2name2col:
-                            col_obj = lower2name2col[c][1]
+                        lower2colname = self._get_lower2colname(tab_obj)
+                        if c in lower2colname:
+                            col_obj = tab_obj.name2col[lower2colname[c]]
                             if tab_obj not in self.projection_dict:
                                 self.projection_dict[tab_obj] = list()
                             self.projection_dict[tab_obj].append(col_obj)
@@ -1746,9 +1790,9 @@ class QueryParser:
                     c = proj.lower()
                     for _, tpair in lower2name2tab.items():
                         _, tab_obj = tpair
-                        lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                        if c in lower2name2col:
-                            col_obj = lower2name2col[c][1]
+                        lower2colname = self._get_lower2colname(tab_obj)
+                        if c in lower2colname:
+                            col_obj = tab_obj.name2col[lower2colname[c]]
                             if tab_obj not in self.projection_dict:
                                 self.projection_dict[tab_obj] = list()
                             self.projection_dict[tab_obj].append(col_obj)
@@ -1764,18 +1808,17 @@ class QueryParser:
     def _check_selection(self, selection_list, from_tables):
 
         def __check_entity(c):
-            if '.' in c:
-                c = c.rsplit('.', 1)[1]
+            c = c.rpartition('.')[2]
             for _, tpair in lower2name2tab.items():
                 _, tab_obj = tpair
-                lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                if c in lower2name2col:
-                    col_obj = lower2name2col[c][1]
+                lower2colname = self._get_lower2colname(tab_obj)
+                if c in lower2colname:
+                    col_obj = tab_obj.name2col[lower2colname[c]]
                     if tab_obj not in self.selection_dict:
                         self.selection_dict[tab_obj] = list()
                     self.selection_dict[tab_obj].append(col_obj)
 
-        lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
+        lower2name2tab = self._get_lower2name2tab(with_last_token=True)
 
         for condition in selection_list:
             if "<=" in condition:
@@ -1808,16 +1851,16 @@ class QueryParser:
 
 
     def _check_aggregate(self, aggregation_list, from_tables):
-        lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
+        lower2name2tab = self._get_lower2name2tab(with_last_token=True)
         for agg_func, agg_col in aggregation_list:
             if '.' in agg_col:
                 # for table-prefix column
-                t, c = agg_col.lower().rsplit('.', 1)
+                t, _, c = agg_col.lower().rpartition('.')
                 if t in lower2name2tab:
                     tab_obj = lower2name2tab[t][1]
-                    lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                    if c in lower2name2col:
-                        col_obj = lower2name2col[c][1]
+                    lower2colname = self._get_lower2colname(tab_obj)
+                    if c in lower2colname:
+                        col_obj = tab_obj.name2col[lower2colname[c]]
                         if tab_obj not in self.aggregate_dict:
                             self.aggregate_dict[tab_obj] = list()
                         self.aggregate_dict[tab_obj].append((agg_func, col_obj))
@@ -1826,24 +1869,24 @@ class QueryParser:
                 c = agg_col.lower()
                 for _, tpair in lower2name2tab.items():
                     _, tab_obj = tpair
-                    lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                    if c in lower2name2col:
-                        col_obj = lower2name2col[c][1]
+                    lower2colname = self._get_lower2colname(tab_obj)
+                    if c in lower2colname:
+                        col_obj = tab_obj.name2col[lower2colname[c]]
                         if tab_obj not in self.aggregate_dict:
                             self.aggregate_dict[tab_obj] = list()
                         self.aggregate_dict[tab_obj].append((agg_func, col_obj))
 
     def _check_groupby(self, groupby_list, from_tables):
-        lower2name2tab = {k.lower(): (k, v) for k, v in self.name2tab.items()} | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in self.name2tab.items() if '.' in k}
+        lower2name2tab = self._get_lower2name2tab(with_last_token=True)
         for col in groupby_list:
             if '.' in col:
                 # for table-prefix column
-                t, c = col.lower().rsplit('.', 1)
+                t, _, c = col.lower().rpartition('.')
                 if t in lower2name2tab:
                     tab_obj = lower2name2tab[t][1]
-                    lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                    if c in lower2name2col:
-                        col_obj = lower2name2col[c][1]
+                    lower2colname = self._get_lower2colname(tab_obj)
+                    if c in lower2colname:
+                        col_obj = tab_obj.name2col[lower2colname[c]]
                         if tab_obj not in self.groupby_dict:
                             self.groupby_dict[tab_obj] = list()
                         self.groupby_dict[tab_obj].append(col_obj)
@@ -1852,9 +1895,9 @@ class QueryParser:
                 c = col.lower()
                 for _, tpair in lower2name2tab.items():
                     _, tab_obj = tpair
-                    lower2name2col = {k.lower(): (k, v) for k, v in tab_obj.name2col.items()}
-                    if c in lower2name2col:
-                        col_obj = lower2name2col[c][1]
+                    lower2colname = self._get_lower2colname(tab_obj)
+                    if c in lower2colname:
+                        col_obj = tab_obj.name2col[lower2colname[c]]
                         if tab_obj not in self.groupby_dict:
                             self.groupby_dict[tab_obj] = list()
                         self.groupby_dict[tab_obj].append(col_obj)
@@ -1877,12 +1920,7 @@ class QueryParser:
                         projection_list.append(tk.value.strip())
 
         def __has_matched_subquery(alias):
-            alias_list = list()
-            for d in query_node.sub_query_list:
-                if d is not None:
-                    alias_list += d.keys()
-                    alias_list += [s.lower() for s in d.keys()]
-            return True if alias in alias_list else False
+            return alias in self._get_alias2query(query_node)
 
         def __norm_column(c):
             if " as " in c:
@@ -1893,18 +1931,13 @@ class QueryParser:
                 if len(from_tables) == 1:
                     return from_tables[0] + '.' + c
                 return c
-            alias, column = c.rsplit('.', 1)
+            alias, _, column = c.rpartition('.')
             if __has_matched_subquery(alias):
                 table, column = self._find_table_in_children(alias, column)
                 return table.strip() + '.' + column.strip()
             # find table's alias in parent scope
             elif query_node.parent:
-                parent = query_node.parent
-                while parent is not None:
-                    table, found = self._find_table_in_parent(alias, parent)
-                    if found:
-                        break
-                    parent = parent.parent
+                table = query_node.parent.scope.get(alias, alias)
                 return table.strip() + '.' + column.strip()
             else:
                 return (query_node.alias2table[alias] + '.' + column).strip() if alias in query_node.alias2table else column
@@ -1928,10 +1961,10 @@ class QueryParser:
                 __extract_from_identifiers(tokens[i])
             elif isinstance(tokens[i], IdentifierList) and __between_select_and_from(i):
                 __extract_from_identifiers(tokens[i])
-            elif "ttype" in dir(tokens[i]) and str(tokens[i].ttype) == "Token.Wildcard" and __between_select_and_from(i):
+            elif "ttype" in dir(tokens[i]) and tokens[i].ttype is T.Wildcard and __between_select_and_from(i):
                 is_wildcard = True
                 projection_list.append('*')
-            elif (str(tokens[i].ttype) == "Token.Keyword" and tokens[i].value.lower() == "from"
+            elif (tokens[i].ttype is T.Keyword and tokens[i].value.lower() == "from"
                     and i + 2 < len(tokens) and "select " not in tokens[i + 2].value.lower()):
                 if ',' in tokens[i + 2].value:
                     tmp = list()
@@ -1952,7 +1985,7 @@ class QueryParser:
                         from_tables.append(tokens[i + 2].value.lower().strip())
 
         if query_node.tables:
-            from_tables = list(set(query_node.tables + from_tables))
+            from_tables = list(dict.fromkeys(query_node.tables + from_tables))
         from_tables = [fmt_str(t) for t in from_tables]
 
         temp_list = list()
@@ -1975,7 +2008,7 @@ class QueryParser:
             if not any(op in t.value for op in ["=", "<", ">"]):
                 return False
             for t in t.tokens:
-                if "Token.Literal" in str(t.ttype):
+                if t.ttype in T.Literal:
                     return True
             return False
 
@@ -2012,12 +2045,7 @@ class QueryParser:
                     __extract_internal_cmp_tokens(token)
 
         def __has_matched_subquery(alias):
-            alias_list = list()
-            for d in query_node.sub_query_list:
-                if d is not None:
-                    alias_list += d.keys()
-                    alias_list += [s.lower() for s in d.keys()]
-            return True if alias in alias_list else False
+            return alias in self._get_alias2query(query_node)
 
         def __norm_column(c):
             if " as " in c:
@@ -2028,19 +2056,13 @@ class QueryParser:
                 if len(from_tables) == 1:
                     return from_tables[0] + '.' + c
                 return c
-            alias, column = c.rsplit('.', 1)
+            alias, _, column = c.rpartition('.')
             if __has_matched_subquery(alias):
                 table, column = self._find_table_in_children(alias, column)
                 return table.strip() + '.' + column.strip()
             # find table's alias in parent scope
             elif query_node.parent:
-                table = ""
-                parent = query_node.parent
-                while parent is not None:
-                    table, found = self._find_table_in_parent(alias, parent)
-                    if found:
-                        break
-                    parent = parent.parent
+                table = query_node.parent.scope.get(alias, alias)
                 if table:
                     return table.strip() + '.' + column.strip()
             return (query_node.alias2table[alias] + '.' + column).strip() if alias in query_node.alias2table else column
@@ -2062,7 +2084,7 @@ class QueryParser:
                 __extract_internal_cmp_tokens(token)
 
         # TODO: filter all the join conditioin
-        selection_list = list(set(selection_list))
+        selection_list = list(dict.fromkeys(selection_list))
 
         if selection_list and from_tables:
             # print(query_node.statement)
@@ -2091,30 +2113,20 @@ class QueryParser:
                     aggregate_list.append((agg_func, agg_col))
 
         def __has_matched_subquery(alias):
-            alias_list = list()
-            for d in query_node.sub_query_list:
-                if d is not None:
-                    alias_list += d.keys()
-                    alias_list += [s.lower() for s in d.keys()]
-            return True if alias in alias_list else False
+            return alias in self._get_alias2query(query_node)
 
         def __norm_column(c):
             if '.' not in c:
                 if len(from_tables) == 1:
                     return from_tables[0] + '.' + c
                 return c
-            alias, column = c.rsplit('.', 1)
+            alias, _, column = c.rpartition('.')
             if __has_matched_subquery(alias):
                 table, column = self._find_table_in_children(alias, column)
                 return table.strip() + '.' + column.strip()
             # find table's alias in parent scope
             elif query_node.parent:
-                parent = query_node.parent
-                while parent is not None:
-                    table, found = self._find_table_in_parent(alias, parent)
-                    if found:
-                        break
-                    parent = parent.parent
+                table = query_node.parent.scope.get(alias, alias)
                 return table.strip() + '.' + column.strip()
             else:
                 return (query_node.alias2table[alias] + '.' + column).strip() if alias in query_node.alias2table else column
@@ -2156,30 +2168,20 @@ class QueryParser:
     def _extract_groupby(self, query_node):
 
         def __has_matched_subquery(alias):
-            alias_list = list()
-            for d in query_node.sub_query_list:
-                if d is not None:
-                    alias_list += d.keys()
-                    alias_list += [s.lower() for s in d.keys()]
-            return True if alias in alias_list else False
+            return alias in self._get_alias2query(query_node)
 
         def __norm_column(c):
             if '.' not in c:
                 if len(from_tables) == 1:
                     return from_tables[0] + '.' + c
                 return c
-            alias, column = c.rsplit('.', 1)
+            alias, _, column = c.rpartition('.')
             if __has_matched_subquery(alias):
                 table, column = self._find_table_in_children(alias, column)
                 return table.strip() + '.' + column.strip()
             # find table's alias in parent scope
             elif query_node.parent:
-                parent = query_node.parent
-                while parent is not None:
-                    table, found = self._find_table_in_parent(alias, parent)
-                    if found:
-                        break
-                    parent = parent.parent
+                table = query_node.parent.scope.get(alias, alias)
                 return table.strip() + '.' + column.strip()
             else:
                 return (query_node.alias2table[alias] + '.' + column).strip() if alias in query_node.alias2table else column
@@ -2190,13 +2192,13 @@ class QueryParser:
         token = query_node.token
         tokens = token.tokens
         try:
-            columns_aliases = Parser(query_node.statement.lower()).columns_aliases
+            columns_aliases = _get_metadata_parser(query_node.statement.lower()).columns_aliases
         except:
             pass
         try:
             for i in range(len(tokens)):
                 prev_tk = tokens[i]
-                if str(prev_tk.ttype) == "Token.Keyword" and prev_tk.value.lower() == "group by":
+                if prev_tk.ttype is T.Keyword and prev_tk.value.lower() == "group by":
                     if i + 2 < len(tokens) and isinstance(tokens[i + 2], IdentifierList):
                         token = tokens[i + 2]
                         for t in [t.strip() for t in token.value.lower().split(',')]:
@@ -2209,7 +2211,7 @@ class QueryParser:
                         column = __norm_column(column)
                         column_list.append(column)
         except Exception as e:
-            print("grouby parse fail:", e)
+            logger.debug("grouby parse fail: %s", e)
 
         if column_list and from_tables:
             # print(query_node.statement)
@@ -2221,7 +2223,7 @@ class QueryParser:
 
     def parse(self, s, filter_join_query=False):
         s = self._preprocess(s)
-        root, = parse(s)
+        root, = _parse_statements(s)
         self.visitor = TokenVisitor(root)
         self.filter_join_query = filter_join_query
         select_tokens = self.visitor.select_tokens
@@ -2234,7 +2236,7 @@ class QueryParser:
 
         if not select_tokens:
             s = s[s.lower().index("select"):]
-            root, = parse(s)
+            root, = _parse_statements(s)
             self.visitor = TokenVisitor(root)
             select_tokens = self.visitor.select_tokens
 
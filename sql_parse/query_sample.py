@@ -2,7 +2,7 @@ from pickle import load
 from pprint import pprint
 from random import sample, choice
 
-from repo_parse_sql import Repository
+from repo_parse_sql import Repository, iter_repo_list
 
 # 对每个user，合并所有repo的name2tab，把合并结果记录到一个哈希表中<repo_user:name2tab>
 # 对每个repo，遍历同一user下的每个unfound table，如果table 不出现在所属的repo内但出现在user下的repo内
@@ -68,8 +68,7 @@ if __name__ == "__main__":
     # exit()
 
     fpath = "data/s4_sql_files_parsed/s4_parsed_sql_repo_list_2022_03_21_07:12:24/s4_parsed_sql_repo_list_2022_03_21_07:12:24.pkl"
-    repo_list = load(open(fpath, "rb"))
-    repo_list = [r for r in repo_list if r.check_failed_cases]
+    repo_list = [r for r in iter_repo_list(fpath) if r.check_failed_cases]
     # calc_failed_cases_num(repo_list)
     # exit()
 
@@ -14,7 +14,7 @@ from concurrent.futures import TimeoutError
 
 from pebble import ProcessPool
 
-from utils import get_chunks
+from utils import get_chunks, iter_pickled
 from s4_parse_sql import parse_repo_files
 
 
@@ -44,6 +44,7 @@ class Repository:
     - parsed_file_list: list[File]
     - join_query_list: list[Query]
     - name2tab: dict[str:Table]
+    - is_empty: bool
 
     Returns
     -------
@@ -198,6 +199,22 @@ class Repository:
             raise TypeError("Could only assign attrib `name2tab` with a dict object!")
         self.__name2tab = d
 
+    @property
+    def is_empty(self):
+        """Get attribute `is_empty`(read-only)
+        Whether the repo has neither tables nor join queries,
+        checked on the private containers directly since it is tested for every repo read back.
+
+        Params
+        ------
+        - None
+
+        Returns
+        -------
+        - bool
+        """
+        return not self.__name2tab and not self.__join_query_list
+
     @property
     def check_failed_cases(self):
         return self.__check_failed_cases
@@ -234,7 +251,30 @@ def dump_repo_list(parsed_repo_list, pkl_dir, pkl_fname):
     - None
     """
     pkl_fpath = os.path.join(pkl_dir, pkl_fname)
-    pickle.dump(parsed_repo_list, open(pkl_fpath, "wb"))
+    # one pickle record per repo, so that readers can stream the repos (see `iter_repo_list`);
+    # the highest protocol gives the most compact opcode stream and the fastest loads
+    with open(pkl_fpath, "wb") as fp:
+        for repo in parsed_repo_list:
+            pickle.dump(repo, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def iter_repo_list(fpath):
+    """Iterate over the repos in a pickle file dumped by `dump_repo_list`, one repo at a time.
+    Files holding a single pickled list of repos (the former format) are also accepted.
+
+    Params
+    ------
+    - fpath: str
+
+    Returns
+    -------
+    - an iterator of Repository
+    """
+    for obj in iter_pickled(fpath):
+        if isinstance(obj, list):
+            yield from obj
+        else:
+            yield obj
 
 
 def make_dir(f_name_base):
@@ -247,12 +287,11 @@ def make_dir(f_name_base):
 
 
 def merge_pkl_files(dir_name):
-    merge_list = list()
     pkl_files = [f for f in glob.glob(os.path.join(dir_name, "*.pkl"))]
-    for pkl_file in pkl_files:
-        partial_list = pickle.load(open(pkl_file, "rb"))
-        merge_list += partial_list
-    pickle.dump(merge_list, open(dir_name + '/' + dir_name.rsplit('/', 1)[-1] + ".pkl", "wb"))
+    with open(dir_name + '/' + dir_name.rsplit('/', 1)[-1] + ".pkl", "wb") as fp:
+        for pkl_file in pkl_files:
+            for repo in iter_repo_list(pkl_file):
+                pickle.dump(repo, fp, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 def aggregate(fpath="data/s2_sql_file_list.txt", max_repo_limit=9999999):
@@ -51,8 +51,8 @@ from cls_def import (
     Index,
     Key,
     ParseStage,
-    Pipeline,
     Table,
+    pipeline,
 )
 from utils import (
     rm_kw,
@@ -74,12 +74,6 @@ INPUT_FOLDER = os.path.join(os.getcwd(), "data/s3_sql_files_crawled_all_vms")
 OUTPUT_FOLDER = os.path.join(os.getcwd(), "data/s4_sql_files_parsed")
 STATEMENT_SIZE_LIMIT = 50000
 
-TOKEN_NOTNULL = "[NOTNULL]"
-# Note: The `UNIQUE` constraint ensures that all values in a column are different,
-#       both the `UNIQUE` and `PRIMARY KEY` constraints provide a guarantee for uniqueness for a column or set of columns.
-#       A `PRIMARY KEY` constraint automatically has a `UNIQUE` constraint.
-#       However, you can have many `UNIQUE` constraints per table, but only one `PRIMARY KEY` constraint per table.
-TOKEN_UNIQUE = "[UNIQUE]"
 TOKEN_TABLE = "[TABLE]"
 TOKEN_COL = "[COL]"
 # prefix of col data types recognized, before we recognize the line to be col definition:
@@ -375,7 +369,7 @@ class File:
                             try:
                                 pk_cols = get_column_object(tab_obj, pk_cols)
                                 pk_obj = File.construct_key_obj("PrimaryKey", pk_cols)
-                                tab_obj.key_list.append(pk_obj)
+                                tab_obj.add_key(pk_obj)
                             except:
                                 continue
                         else:
@@ -459,7 +453,7 @@ class File:
                             try:
                                 uk_cols = get_column_object(tab_obj, uk_cols)
                                 uk_obj = File.construct_key_obj("UniqueKey", uk_cols)
-                                tab_obj.key_list.append(uk_obj)
+                                tab_obj.add_key(uk_obj)
                             except:
                                 continue
                         else:
@@ -488,7 +482,7 @@ class File:
                             try:
                                 pk_cols = get_column_object(tab_obj, pk_cols)
                                 pk_obj = File.construct_key_obj("PrimaryKey", pk_cols)
-                                tab_obj.key_list.append(pk_obj)
+                                tab_obj.add_key(pk_obj)
                             except:
                                 continue
                         else:
@@ -522,13 +516,12 @@ class File:
 
                         col_obj = Column(pk_col, pk_col_type)
                         tab_obj.insert_col(col_obj)
-                        tab_obj.col_name_seq.append(pk_col)
 
                         if self.is_pk_ref_valid(tab_obj, pk_col):
                             try:
                                 pk_col = get_column_object(tab_obj, pk_col)
                                 pk_obj = File.construct_key_obj("PrimaryKey", pk_col)
-                                tab_obj.key_list.append(pk_obj)
+                                tab_obj.add_key(pk_obj)
                             except:
                                 continue
                         else:
@@ -598,7 +591,7 @@ class File:
                         try:
                             uk_cols = get_column_object(tab_obj, uk_cols)
                             uk_obj = File.construct_key_obj("UniqueKey", uk_cols)
-                            tab_obj.key_list.append(uk_obj)
+                            tab_obj.add_key(uk_obj)
                         except:
                             continue
                     else:
@@ -628,7 +621,7 @@ class File:
                         try:
                             key_cols = get_column_object(tab_obj, key_cols)
                             key_obj = File.construct_key_obj("CandidateKey", key_cols)
-                            tab_obj.key_list.append(key_obj)
+                            tab_obj.add_key(key_obj)
                         except:
                             continue
                     else:
@@ -655,7 +648,7 @@ class File:
                         try:
                             ui_cols = get_column_object(tab_obj, ui_cols)
                             ui_obj = File.construct_key_obj("UniqueIndex", ui_cols)
-                            tab_obj.key_list.append(ui_obj)
+                            tab_obj.add_key(ui_obj)
                             uniq_idx_obj = File.construct_index_obj("UniqueIndex", ui_cols)
                             tab_obj.index_list.append(uniq_idx_obj)
                         except:
@@ -683,7 +676,7 @@ class File:
                         try:
                             uk_cols = get_column_object(tab_obj, uk_cols)
                             uk_obj = File.construct_key_obj("UniqueKey", uk_cols)
-                            tab_obj.key_list.append(uk_obj)
+                            tab_obj.add_key(uk_obj)
                         except:
                             continue
                     else:
@@ -709,7 +702,7 @@ class File:
                         try:
                             index_cols = get_column_object(tab_obj, index_cols)
                             index_obj = File.construct_key_obj("Index", index_cols)
-                            tab_obj.key_list.append(index_obj)
+                            tab_obj.add_key(index_obj)
                             idx_obj = File.construct_index_obj("Index", ui_cols)
                             tab_obj.index_list.append(idx_obj)
                         except:
@@ -740,13 +733,12 @@ class File:
                         # handle UNIQUE constraint in ordinary column
                         if "unique" in clause_lower:
                             uniq_col_obj = File.construct_key_obj("UniqueColumn", [col_obj])
-                            tab_obj.key_list.append(uniq_col_obj)
+                            tab_obj.add_key(uniq_col_obj)
 
                         if "not null" in clause_lower:
                             col_obj.is_notnull = True
                         # add col_obj into table_obj
                         tab_obj.insert_col(col_obj)
-                        tab_obj.col_name_seq.append(col_name)
 
                         if "foreign key references" in clause_lower:
                             try:
@@ -834,13 +826,12 @@ class File:
                     # handle UNIQUE constraint in ordinary column
                     if "unique" in clause_lower:
                         uniq_col_obj = File.construct_key_obj("UniqueColumn", [col_obj])
-                        tab_obj.key_list.append(uniq_col_obj)
+                        tab_obj.add_key(uniq_col_obj)
 
                     if "not null" in clause_lower:
                         col_obj.is_notnull = True
                     # add col_obj into table_obj
                     tab_obj.insert_col(col_obj)
-                    tab_obj.col_name_seq.append(c_name)
 
             """
             if "key " in stmt_lower:
@@ -954,7 +945,6 @@ class File:
                     if col_obj.col_name not in tab_obj.name2col:
                         new_col_obj = Column(col_obj.col_name, col_obj.col_type)
                         tab_obj.insert_col(new_col_obj)
-                        tab_obj.col_name_seq.append(col_obj.col_name)
                         column_list.append(col_obj.col_name)
                 continue
             elif " as " in c.lower():
@@ -972,7 +962,6 @@ class File:
                         if col_obj.col_name not in tab_obj.name2col:
                             new_col_obj = Column(col_obj.col_name, col_obj.col_type)
                             tab_obj.insert_col(new_col_obj)
-                            tab_obj.col_name_seq.append(col_obj.col_name)
                             column_list.append(col_obj.col_name)
                     continue
                 except:
@@ -983,7 +972,6 @@ class File:
             if col not in tab_obj.name2col:
                 col_obj = Column(col)
                 tab_obj.insert_col(col_obj)
-                tab_obj.col_name_seq.append(col)
         # print("input create table as stmt:", stmt)
         # print(f"create table as select succ: table: {table_name}, columns: {column_list}")
         # pprint(tab_obj.name2col)
@@ -1088,7 +1076,7 @@ class File:
                     if self.is_pk_ref_valid(tab_obj, pk_cols):
                         pk_cols = get_column_object(tab_obj, pk_cols)
                         pk_obj = File.construct_key_obj("PrimaryKey", pk_cols)
-                        tab_obj.key_list.append(pk_obj)
+                        tab_obj.add_key(pk_obj)
                     else:
                         raise Exception("ADD PRIMARY KEY error: column(s) on alter table not found!")
                 elif "foreign key" in clause_lower:
@@ -1165,7 +1153,7 @@ class File:
                         if self.is_uk_ref_valid(tab_obj, uk_cols):
                             uk_cols = get_column_object(tab_obj, uk_cols)
                             uk_obj = File.construct_key_obj("UniqueKey", uk_cols)
-                            tab_obj.key_list.append(uk_obj)
+                            tab_obj.add_key(uk_obj)
                         else:
                             raise Exception("ADD UNIQUE KEY error: references on alter table not found!")
                     # 2) handle ADD UNIQUE INDEX
@@ -1184,7 +1172,7 @@ class File:
                         if self.is_ui_ref_valid(tab_obj, ui_cols):
                             ui_cols = get_column_object(tab_obj, ui_cols)
                             ui_obj = File.construct_key_obj("UniqueIndex", ui_cols)
-                            tab_obj.key_list.append(ui_obj)
+                            tab_obj.add_key(ui_obj)
                             uniq_idx_obj = File.construct_index_obj("UniqueIndex", ui_cols)
                             tab_obj.index_list.append(uniq_idx_obj)
                         else:
@@ -1203,7 +1191,7 @@ class File:
                         if self.is_uk_ref_valid(tab_obj, uk_cols):
                             uk_cols = get_column_object(tab_obj, uk_cols)
                             uk_obj = File.construct_key_obj("UniqueKey", uk_cols)
-                            tab_obj.key_list.append(uk_obj)
+                            tab_obj.add_key(uk_obj)
                         else:
                             raise Exception("ADD CONSTRIANT UNIQUE error: references on alter table not found!")
                     # 4) handle CREATE UNIQUE [constraint_name] INDEX
@@ -1222,7 +1210,7 @@ class File:
                         if self.is_ui_ref_valid(tab_obj, ref_cols):
                             ref_cols = get_column_object(tab_obj, ref_cols)
                             ui_obj = File.construct_key_obj("UniqueIndex", ref_cols)
-                            tab_obj.key_list.append(ui_obj)
+                            tab_obj.add_key(ui_obj)
                             uniq_idx_obj = File.construct_index_obj("UniqueIndex", ui_cols)
                             tab_obj.index_list.append(uniq_idx_obj)
                         else:
@@ -1243,7 +1231,7 @@ class File:
                     if self.is_key_ref_valid(tab_obj, key_cols):
                         key_cols = get_column_object(tab_obj, key_cols)
                         key_obj = File.construct_key_obj("CandidateKey", key_cols)
-                        tab_obj.key_list.append(key_obj)
+                        tab_obj.add_key(key_obj)
                     else:
                         raise Exception("ADD KEY error: references on alter table not found!")
                 elif clause_lower.startswith(("add ", "add column")):
@@ -1262,7 +1250,6 @@ class File:
                     if ' ' in col_name:
                         continue
                     tab_obj.name2col[col_name] = Column(col_name, col_type)
-                    tab_obj.col_name_seq.append(col_name)
                 else:
                     # print(f"Unhandled operation on alter table: {clause}")
                     pass
@@ -1300,7 +1287,7 @@ class File:
                 idx_cols = get_column_object(tab_obj, idx_cols)
                 idx_obj = File.construct_key_obj("UniqueIndex", idx_cols)\
                     if "create unique index" in stmt_lower else File.construct_key_obj("Index", idx_cols)
-                tab_obj.key_list.append(idx_obj)
+                tab_obj.add_key(idx_obj)
                 if "create unique index" in stmt_lower:
                     uniq_idx_obj = File.construct_index_obj("UniqueIndex", idx_cols)
                     tab_obj.index_list.append(uniq_idx_obj)
@@ -1359,7 +1346,6 @@ class File:
                 continue
             if col.lower() not in lower2name2col:
                 table_obj.name2col[col] = Column(col)
-                table_obj.col_name_seq.append(col)
 
     def parse_one_statement(self, stmt):
         """Parse single SQL statement splitted by semicolon `;`
@@ -1572,7 +1558,7 @@ def parse_repo_files(repo_obj):
                 # with open(fp, encoding="utf-8", errors="ignore") as f:
                 lines = open_sql_file(fp)
                 # lines = f.readlines()
-                with Pipeline(file_obj_queue) as file_obj:
+                with pipeline(file_obj_queue) as file_obj:
                     try:
                         stmts = ''.join(lines)
                         # stmts = convert_camel_to_underscore(stmts)
@@ -1590,7 +1576,7 @@ def parse_repo_files(repo_obj):
                 # with open(fp, encoding="utf-8", errors="ignore") as f:
                 lines = open_sql_file(fp)
                 # lines = f.readlines()
-                with Pipeline(file_obj_queue) as file_obj:
+                with pipeline(file_obj_queue) as file_obj:
                     try:
                         stmts = ''.join(lines)
                         # stmts = convert_camel_to_underscore(stmts)
@@ -1601,7 +1587,7 @@ def parse_repo_files(repo_obj):
                 # handle FKs in each `file_obj.memo`
                 # n.b. according missing referred table name,
                 #      search if there is matched table object in repo.name2tab and its cols in tab_obj.name2col.
-                with Pipeline(file_obj_queue) as file_obj:
+                with pipeline(file_obj_queue) as file_obj:
                     lower2name2tab = {k.lower(): (k, v) for k, v in repo_obj.name2tab.items()} \
                         | {k.lower().rsplit('.', 1)[-1]: (k, v) for k, v in repo_obj.name2tab.items() if '.' in k}
                     if len(file_obj.memo) != 0:
@@ -1644,7 +1630,7 @@ def parse_repo_files(repo_obj):
                 # stmts = list()
                 # s = """create or replace procedure apidb.insert_user_allstudies (userid IN NUMBER) is begin for i in (select vu.dataset_presenter_id from apidbtuning.datasetpresenter dp, studyaccess.ValidDatasetUser@acctdbn.profile vu where dp.dataset_presenter_id = vu.dataset_presenter_id MINUS select dataset_presenter_id from studyaccess.ValidDatasetUser@acctdbn.profile vu where vu.user_id = userid ) loop dbms_output.put_line(' Inserting: ' || i.dataset_presenter_id)"""
                 # stmts.append(s)
-                with Pipeline(file_obj_queue) as file_obj:
+                with pipeline(file_obj_queue) as file_obj:
                     try:
                         for s in stmts:
                             if len(s) > 50000:
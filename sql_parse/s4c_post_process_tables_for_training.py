@@ -47,44 +47,43 @@ total_na_cols = 0
 input_pkl_file = 's4_parsed_sql_repo_list_2022_04_12_08:17:37_0.pkl'
 ### we want to customize lm, in terms of what table to show and not show (e.g., a table with no constraint is skipped, a table with all NOTNULL is skipped, etc.)
 ### for diff SKIP_NO_CONSTRAINT_TABLE/SKIP_ALL_NOTNULL_TABLE settings
-with open(os.path.join(INPUT_FOLDER, input_pkl_file), 'rb') as f:
-    repo_list = pickle.load(f)
+repo_list = iter_repo_list(os.path.join(INPUT_FOLDER, input_pkl_file))
+
+cnt = 0
+for repo in repo_list:
     
-    cnt = 0
-    for repo in repo_list:
-        
-        
-        # filter tables, based on whether they have constraints, or they are aggressively all-not-nulls
-        tab_list_after_filter = []
-        #for f_obj in repo.parsed_file_list:
+    
+    # filter tables, based on whether they have constraints, or they are aggressively all-not-nulls
+    tab_list_after_filter = []
+    #for f_obj in repo.parsed_file_list:
 
-        #for tab_name in repo.name2tab:
-        for tab_name in repo.name2tab:
-            cnt += 1
-            if(cnt % 1000 == 0):
-                print(cnt)
-            if(DEBUG and cnt == 50000):
-                break
-        
-            tab_obj = repo.name2tab[tab_name]
-            total_input_tables += 1
-            if(len(tab_obj._name2col) == 0):
-                continue
-            if(SKIP_NO_CONSTRAINT_TABLE and tab_obj.is_table_all_cols_no_constraint()):
-                total_skipped_no_constraint_tables += 1
-                continue
-            """
-            if(tab_obj.calc_table_notnull_perc() > SKIP_NOTNULL_TABLE_HIGHER_THAN_THRESHOLD):
-                total_skipped_too_high_notnull_tables += 1
-                continue
-            """
-            tab_list_after_filter.append(tab_obj)
-            
+    #for tab_name in repo.name2tab:
+    for tab_name in repo.name2tab:
+        cnt += 1
+        if(cnt % 1000 == 0):
+            print(cnt)
+        if(DEBUG and cnt == 50000):
+            break
+    
+        tab_obj = repo.name2tab[tab_name]
+        total_input_tables += 1
+        if(len(tab_obj._name2col) == 0):
+            continue
+        if(SKIP_NO_CONSTRAINT_TABLE and tab_obj.is_table_all_cols_no_constraint()):
+            total_skipped_no_constraint_tables += 1
+            continue
+        """
+        if(tab_obj.calc_table_notnull_perc() > SKIP_NOTNULL_TABLE_HIGHER_THAN_THRESHOLD):
+            total_skipped_too_high_notnull_tables += 1
+            continue
+        """
+        tab_list_after_filter.append(tab_obj)
         
+    
 # from all filtered tables, find duplicates
 key_2_tab_list_dict = {}
 for tab_obj in tab_list_after_filter:
-    sorted_cols = sorted(tab_obj.col_name_seq)
+    sorted_cols = sorted(tab_obj.name2col)
     tab_col_name_concat_key = tab_obj.tab_name + ':' + '___'.join(sorted_cols)
     if(tab_col_name_concat_key not in key_2_tab_list_dict):
         key_2_tab_list_dict[tab_col_name_concat_key] = []
@@ -94,7 +93,7 @@ for tab_obj in tab_list_after_filter:
 key_2_tab_list_dict = {k: v for k, v in sorted(key_2_tab_list_dict.items(), reverse=True, key=lambda item: len(item[1]))}
 
 ## write to CSV,
-with open(ouput_lm_csv_file, 'w') as csv_writer, open(ouput_lm_csv_file_stats, 'w') as stats_writer:
+with open(ouput_lm_csv_file, 'w', buffering=1 << 20) as csv_writer, open(ouput_lm_csv_file_stats, 'w') as stats_writer:
     all_tabs_to_print = []
     for k, v in key_2_tab_list_dict.items():
         stats_writer.write('****** new dup cluster ***** \n')
@@ -117,8 +116,9 @@ with open(ouput_lm_csv_file, 'w') as csv_writer, open(ouput_lm_csv_file_stats, '
     # print
     for tab_obj in all_tabs_to_print:
         lines = tab_obj.print_for_lm_multi_line()
-        for l in lines:
-            csv_writer.write(l + '\n')
+        if lines:
+            csv_writer.write('\n'.join(lines))
+            csv_writer.write('\n')
         
     """
         total_notnull_cols += tab_obj.total_inferred_notnull_col_cnt()
@@ -1,6 +1,5 @@
 import sys
 import random
-from pickle import load
 
 
 def print_query_obj(query_obj, f=sys.stdout):
@@ -25,12 +24,12 @@ def print_fk_obj(tab_name, fk_obj, f=sys.stdout):
     print(f"\t{tab_name}", file=f)
     print("fk columns:", file=f)
     for col_obj in fk_obj.fk_cols:
-        print_column_obj(col_obj)
+        print_column_obj(col_obj, f=f)
     print("fk referred table:", file=f)
     print(f"\t{fk_obj.ref_tab.tab_name}", file=f)
     print("referred columns:", file=f)
     for col_obj in fk_obj.ref_cols:
-        print_column_obj(col_obj)
+        print_column_obj(col_obj, f=f)
 
 
 def print_table_obj(table_obj, f=sys.stdout):
@@ -58,8 +57,8 @@ def print_repo_obj(repo_obj, f=sys.stdout):
 
 
 def sample_create_table_from_pickle_file(fpath):
-    repo_list = load(open(fpath, "rb"))
-    repo_list = [r for r in repo_list if len(r.name2tab) >= 3]
+    from repo_parse_sql import iter_repo_list
+    repo_list = [r for r in iter_repo_list(fpath) if len(r.name2tab) >= 3]
     return random.sample(repo_list, 100)
 
 
@@ -3,7 +3,12 @@
 # @email: v-yangliu4@microsoft.com
 
 
+import io
 import unittest
+from contextlib import redirect_stdout
+
+from cls_def import Column, Table
+from parse_query import QueryParser
 
 
 def test_badcase():
@@ -620,6 +625,59 @@ def get_add_key_case_on_alter():
     """
 
 
+def get_join_condition_case_on_select():
+    """(query, normalized conditions) pairs, every condition links `orders` to `customers`."""
+    return [
+        # case 0: sub-query in FROM
+        ("SELECT a.id, c.name FROM (SELECT id, customer_id FROM orders) a JOIN customers c ON a.customer_id = c.id",
+         [("orders.customer_id", "Eq", "customers.id")]),
+        # case 1: sub-query in JOIN
+        ("SELECT o.id, cc.name FROM orders o JOIN (SELECT id, name FROM customers) cc ON o.customer_id = cc.id",
+         [("orders.customer_id", "Eq", "customers.id")]),
+        # case 2: unqualified column
+        ("SELECT o.id, c.name FROM orders o JOIN customers c ON customer_id = c.id",
+         [("orders.customer_id", "Eq", "customers.id")]),
+        # case 3: mixed case
+        ("SELECT O.Id, C.Name FROM Orders O JOIN Customers C ON O.Customer_Id = C.Id",
+         [("Orders.customer_id", "Eq", "Customers.id")]),
+    ]
+
+
+class JoinConditionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.name2tab = dict()
+        for tab_name, col_names in (("orders", ("id", "customer_id", "amount")), ("customers", ("id", "name"))):
+            tab_obj = Table(tab_name, "")
+            for col_name in col_names:
+                tab_obj.insert_col(Column(col_name))
+            self.name2tab[tab_name] = tab_obj
+
+    def assert_join_condition(self, stmt, conditions):
+        parser = QueryParser(self.name2tab)
+        with redirect_stdout(io.StringIO()):
+            parser.parse(stmt)
+        self.assertEqual(parser.condition_list, conditions)
+        self.assertEqual(
+            [(b.table_a.table_name, b.table_b.table_name, [(l.col_name, op, r.col_name) for l, op, r in b.conditions])
+             for b in parser.binary_join_list],
+            [("orders", "customers", [("customer_id", "Eq", "id")])],
+        )
+
+    def test_join_condition_kept(self):
+        # the sides qualified by `_get_left_right` are limit columns of the node, the conditions must not be dropped
+        for stmt, conditions in get_join_condition_case_on_select():
+            with self.subTest(stmt=stmt):
+                self.assert_join_condition(stmt, conditions)
+
+    @unittest.expectedFailure
+    def test_sub_query_column_alias(self):
+        # the column aliased in the sub-query is qualified twice, as `orders.orders.customer_id`
+        self.assert_join_condition(
+            "SELECT a.x, c.name FROM (SELECT o.customer_id AS x FROM orders o) a, customers c WHERE a.x = c.id",
+            [("orders.customer_id", "Eq", "customers.id")],
+        )
+
+
 class MyTestCase(unittest.TestCase):
     def test_something(self):
         self.assertEqual(True, False)  # add assertion here
@@ -6,6 +6,7 @@
 import os
 import re
 import glob
+import pickle
 import signal
 from pprint import pprint
 from random import sample
@@ -19,6 +20,10 @@ BINARY_OP = ["=", "<", ">", "<=", ">="]
 
 CHARSET_LIST = list(set([v for _, v in aliases.aliases.items()]))
 
+# patterns of `clean_stmt`, compiled once at import
+COMMENT_REGEX = re.compile(r"(\s+comment\s*[\s|=]?\s*['|\"\`].*?['|\"\`])[,|\n|;]", re.IGNORECASE)
+TYPE_SIZE_REGEX = re.compile(r"\(\d+[,\s*\d*]*\)", re.IGNORECASE)
+
 
 class ColumnTypeDict:
     """Original SQL Column Type to Self-defined Column Type."""
@@ -437,13 +442,11 @@ def clean_stmt(stmt):
     # remove COMMENT ...
     # pattern = "(\s+comment\s*[\s|=]?\s*['|\"\`].*?['|\"\`])[,|\n|;]"
     # result = re.findall(pattern, stmt, re.IGNORECASE)
-    pat = re.compile("(\s+comment\s*[\s|=]?\s*['|\"\`].*?['|\"\`])[,|\n|;]", re.IGNORECASE)
-    result = pat.findall(stmt)
+    result = COMMENT_REGEX.findall(stmt)
     for item in result:
         stmt = stmt.replace(item, "")
     # remove type size with parentheses
-    pat = re.compile("\(\d+[,\s*\d*]*\)", re.IGNORECASE)
-    stmt = pat.sub("", stmt)
+    stmt = TYPE_SIZE_REGEX.sub("", stmt)
     # stmt = re.sub("\(\d+[,\s*\d*]*\)", "", stmt, re.IGNORECASE)
     return stmt
 
@@ -555,6 +558,26 @@ def get_chunks(lst, n):
         yield lst[i:i + n]
 
 
+def iter_pickled(fpath):
+    """Iterate over the objects pickled one after another into a file,
+    loading one of them at a time instead of the whole file at once.
+
+    Params
+    ------
+    - fpath: str
+
+    Returns
+    -------
+    - an iterator of the unpickled objects
+    """
+    with open(fpath, "rb") as fp:
+        while True:
+            try:
+                yield pickle.load(fp)
+            except EOFError:
+                break
+
+
 def open_sql_file(fpath):
     # print("open a sql file")
     try: